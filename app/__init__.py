@@ -1,6 +1,7 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+from sqlalchemy import event
 import os
 import logging
 
@@ -14,6 +15,23 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# SQLite tuning. The web container and the worker share instance/db.sqlite3, so use WAL (readers
+# don't block on the writer and vice versa), wait on locks instead of failing with "database is
+# locked", and let reads go through a memory map.
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+SQLITE_POOL_SIZE = int(os.environ.get('SQLITE_POOL_SIZE', '5'))
+
+def configure_sqlite_connection(dbapi_connection, connection_record=None):
+    # Runs for every new pooled connection (SQLAlchemy "connect" event)
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL") # Safe with WAL; only the last commits can be lost on power failure
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
 def create_app():
     app = Flask(__name__)
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev')
@@ -27,6 +45,14 @@ def create_app():
     # Use instance path for DB to simplify Docker volume persistence
     db_path = os.path.join(app.instance_path, 'db.sqlite3')
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('SQLALCHEMY_DATABASE_URI', f'sqlite:///{db_path}')
+    is_sqlite = app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite')
+    if is_sqlite:
+        # One connection pool per process, shared by request/scan/dispatch threads
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'pool_size': SQLITE_POOL_SIZE,
+            'max_overflow': SQLITE_POOL_SIZE,
+            'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000, 'check_same_thread': False},
+        }
 
     db.init_app(app)
     login_manager.init_app(app)
@@ -44,7 +70,12 @@ def create_app():
     # Scheduler logic moved to run_worker.py for container separation
 
     with app.app_context():
+        if is_sqlite:
+            event.listen(db.engine, 'connect', configure_sqlite_connection)
         db.create_all()
+        # Add columns introduced since the database was created
+        from .migrations import upgrade_schema
+        upgrade_schema()
         # Create default admin if no users exist (configurable via env)
         skip_admin = os.environ.get('SKIP_DEFAULT_ADMIN', 'false').lower() == 'true'
         if not skip_admin and not User.query.first():
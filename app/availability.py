@@ -0,0 +1,189 @@
+import re
+import numpy as np
+
+# Incremental availability/map parsing (AvailabilityStreamParser)
+_RESOURCES_KEY = re.compile(rb'"resourceAvailabilities"\s*:\s*\{')
+_RESOURCE_START = re.compile(rb'\s*,?\s*"(-?\d+)"\s*:\s*\[')
+_RESOURCES_END = re.compile(rb'\s*\}')
+_AVAILABILITY = re.compile(rb'"availability"\s*:\s*(-?\d+)')
+_DAY = re.compile(rb'\{([^{}]*)\}')
+# Unconsumed bytes kept between chunks while looking for the next token
+_LOOKAHEAD = 256
+
+class AvailabilityMatrix:
+    """
+    One availability/map response packed into a (resources x days) boolean matrix.
+    Built once per map per tick and shared by every alert watching that map;
+    each alert evaluates its own window and campsite selection against it.
+    """
+
+    def __init__(self, resource_ids, available, start_date):
+        self.resource_ids = resource_ids # list of int, row order
+        self.available = available # np.ndarray[bool], shape (len(resource_ids), days)
+        self.start_date = start_date # date of column 0
+
+    @classmethod
+    def from_response(cls, data, start_date):
+        res_avails = data.get('resourceAvailabilities', {}) or {}
+        resource_ids = [int(res_id) for res_id in res_avails]
+        width = max((len(daily) for daily in res_avails.values()), default=0)
+
+        available = np.zeros((len(resource_ids), width), dtype=bool)
+        for row, daily_data in enumerate(res_avails.values()):
+            # 0 == available; anything else (or missing) is not
+            available[row, :len(daily_data)] = [day.get('availability', -1) == 0 for day in daily_data]
+        return cls(resource_ids, available, start_date)
+
+    @classmethod
+    def stitch(cls, parts, start_date, num_days):
+        """
+        Combine matrices covering different date ranges (e.g. a fresh near-term segment and a
+        cached far-term one) into one matrix of num_days starting at start_date. Later parts win
+        where they overlap; days no part covers are unavailable.
+        """
+        resource_ids = []
+        rows = {}
+        for part in parts:
+            for res_id in part.resource_ids:
+                if res_id not in rows:
+                    rows[res_id] = len(resource_ids)
+                    resource_ids.append(res_id)
+
+        available = np.zeros((len(resource_ids), num_days), dtype=bool)
+        for part in parts:
+            offset = (part.start_date - start_date).days
+            lo = max(offset, 0)
+            hi = min(offset + part.num_days, num_days)
+            if hi <= lo or not part.resource_ids:
+                continue
+            targets = [rows[res_id] for res_id in part.resource_ids]
+            available[targets, lo:hi] = part.available[:, lo - offset:hi - offset]
+        return cls(resource_ids, available, start_date)
+
+    @property
+    def num_days(self):
+        return self.available.shape[1]
+
+    def find_runs(self, scan_start, scan_end, end_date, min_nights, campsite_ids=None):
+        """
+        Find runs of >= min_nights consecutive available days inside [scan_start, scan_end]
+        that start on or before end_date (the latest arrival date). A run may continue past
+        end_date. Returns {res_id: [(start_ordinal, nights), ...]} in response order,
+        where start_ordinal is the run's first day as date.toordinal().
+        """
+        offset = (scan_start - self.start_date).days
+        lo = max(offset, 0)
+        hi = min(offset + (scan_end - scan_start).days + 1, self.num_days)
+        if hi <= lo or not self.resource_ids:
+            return {}
+
+        if campsite_ids:
+            targets = campsite_ids if isinstance(campsite_ids, (set, frozenset)) else set(campsite_ids)
+            rows = np.fromiter((res_id in targets for res_id in self.resource_ids), dtype=bool, count=len(self.resource_ids))
+            row_ids = [res_id for res_id in self.resource_ids if res_id in targets]
+            window = self.available[rows, lo:hi]
+        else:
+            row_ids = self.resource_ids
+            window = self.available[:, lo:hi]
+        if window.size == 0:
+            return {}
+
+        # Pad with unavailable days on both sides so every run has a rising and a falling edge
+        padded = np.zeros((window.shape[0], window.shape[1] + 2), dtype=np.int8)
+        padded[:, 1:-1] = window
+        edges = np.diff(padded, axis=1)
+        start_rows, start_cols = np.nonzero(edges == 1)
+        _, end_cols = np.nonzero(edges == -1)
+        lengths = end_cols - start_cols
+
+        last_arrival = (end_date - self.start_date).days - lo
+        keep = (lengths >= min_nights) & (start_cols <= last_arrival)
+
+        base_ordinal = self.start_date.toordinal() + lo
+        findings = {}
+        for row, col, nights in zip(start_rows[keep].tolist(), start_cols[keep].tolist(), lengths[keep].tolist()):
+            res_id = row_ids[row]
+            if res_id not in findings:
+                findings[res_id] = []
+            findings[res_id].append((base_ordinal + col, nights))
+        return findings
+
+class AvailabilityStreamParser:
+    """
+    Builds an AvailabilityMatrix from an availability/map response fed in chunks, without
+    materialising the JSON document: only resourceAvailabilities is read, each resource's days
+    are reduced to one bool per day as soon as its list is complete, and resources outside
+    `wanted` (a set of site ids, None for all) are skipped without decoding.
+    feed() and finish() raise ValueError on anything unexpected; callers fall back to json.
+    """
+
+    def __init__(self, start_date, wanted=None):
+        self.start_date = start_date
+        self.wanted = wanted
+        self.resource_ids = []
+        self.rows = []
+        self._buffer = b''
+        self._state = 'seek' # seek -> resources -> done
+
+    def feed(self, chunk):
+        if self._state == 'done':
+            return
+        buf = self._buffer + chunk if self._buffer else chunk
+        pos = 0
+        while self._state != 'done':
+            if self._state == 'seek':
+                match = _RESOURCES_KEY.search(buf, pos)
+                if match is None:
+                    # The key may be split across chunks
+                    pos = max(pos, len(buf) - _LOOKAHEAD)
+                    break
+                pos = match.end()
+                self._state = 'resources'
+                continue
+
+            match = _RESOURCES_END.match(buf, pos)
+            if match is not None:
+                pos = match.end()
+                self._state = 'done'
+                break
+            match = _RESOURCE_START.match(buf, pos)
+            if match is None:
+                if len(buf) - pos > _LOOKAHEAD:
+                    raise ValueError(f"Unexpected data in resourceAvailabilities at byte {pos}")
+                break
+            end = buf.find(b']', match.end())
+            if end == -1:
+                break # list not complete yet
+            res_id = int(match.group(1))
+            if self.wanted is None or res_id in self.wanted:
+                self._add(res_id, buf[match.end():end])
+            pos = end + 1
+        self._buffer = buf[pos:] if self._state != 'done' else b''
+
+    def _add(self, res_id, days):
+        if b'[' in days:
+            raise ValueError(f"Nested list in the days of resource {res_id}")
+        num_days = days.count(b'{')
+        codes = _AVAILABILITY.findall(days)
+        if len(codes) != num_days:
+            # Some day has no (or more than one) availability key; go day by day like from_response
+            codes = []
+            for day in _DAY.finditer(days):
+                found = _AVAILABILITY.search(day.group(1))
+                codes.append(found.group(1) if found else b'-1')
+            if len(codes) != num_days:
+                raise ValueError(f"Malformed days of resource {res_id}")
+        # 0 == available; anything else (or missing) is not
+        self.resource_ids.append(res_id)
+        self.rows.append(np.fromiter((code == b'0' for code in codes), dtype=bool, count=len(codes)))
+
+    def finish(self):
+        if self._state != 'done':
+            # No (or a null, or a truncated) resourceAvailabilities: let json sort it out
+            raise ValueError(f"Response ended while in state {self._state}")
+        width = max((len(row) for row in self.rows), default=0)
+        available = np.zeros((len(self.rows), width), dtype=bool)
+        for index, row in enumerate(self.rows):
+            available[index, :len(row)] = row
+        self.rows = []
+        return AvailabilityMatrix(self.resource_ids, available, self.start_date)
@@ -0,0 +1,88 @@
+import os
+import re
+import time
+import threading
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .metrics import UPSTREAM_REQUEST_SECONDS, UPSTREAM_RESPONSES, UPSTREAM_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Shared HTTP client for camping.bcparks.ca.
+# One pooled keep-alive session per process so repeated calls reuse TCP/TLS connections.
+
+BASE_URL = os.environ.get('BCPARKS_BASE_URL', 'https://camping.bcparks.ca').rstrip('/')
+
+# Keep at least as large as SCAN_CONCURRENCY so scan threads never wait on a connection
+POOL_SIZE = int(os.environ.get('BCPARKS_POOL_SIZE', '10'))
+MAX_RETRIES = int(os.environ.get('BCPARKS_MAX_RETRIES', '3'))
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept-Encoding': 'gzip, deflate'
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+def _build_session():
+    # Retry rate limiting and transient server errors with exponential backoff (honours Retry-After)
+    retry = Retry(
+        total=MAX_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retry)
+
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                logger.debug(f"Creating BC Parks HTTP session (pool size {POOL_SIZE})")
+                _session = _build_session()
+    return _session
+
+def metric_endpoint(path):
+    # Ids in the path would make one metric series per campground
+    return re.sub(r'/-?\d+', '/{id}', path)
+
+def get(path, params=None, timeout=15, stream=False):
+    """
+    GET a BC Parks API path (e.g. '/api/maps') through the shared session.
+    Returns the requests.Response; raises requests exceptions like requests.get.
+    With stream=True the body is left unread: the caller reads it (iter_content), closes the
+    response and calls stream_finished, so the request time includes the body download.
+    """
+    endpoint = metric_endpoint(path)
+    started = time.perf_counter()
+    try:
+        resp = get_session().get(f"{BASE_URL}{path}", params=params, timeout=timeout, stream=stream)
+    except Exception as e:
+        UPSTREAM_RESPONSES.labels(endpoint, type(e).__name__).inc()
+        UPSTREAM_REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - started)
+        raise
+    UPSTREAM_RESPONSES.labels(endpoint, resp.status_code).inc()
+    if stream:
+        resp.started = started
+    else:
+        UPSTREAM_REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - started)
+        UPSTREAM_BYTES.labels(endpoint).inc(len(resp.content))
+    return resp
+
+def stream_finished(path, resp, num_bytes):
+    # Request time (headers + body) and bytes of a stream=True response, once its body has been read
+    endpoint = metric_endpoint(path)
+    UPSTREAM_REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - resp.started)
+    UPSTREAM_BYTES.labels(endpoint).inc(num_bytes)
@@ -0,0 +1,99 @@
+import json
+import hashlib
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class TTLCache:
+    """
+    Small thread-safe cache with per-entry expiry and LRU eviction once maxsize is reached.
+    Keys must be strings and values JSON-serializable so the cache can be snapshotted to disk.
+    """
+
+    def __init__(self, maxsize=256, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict() # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._dirty = False
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.time() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            self._dirty = True
+
+    def __len__(self):
+        return len(self._data)
+
+    def load(self, path):
+        # Restore a snapshot written by save(), skipping anything already expired
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except Exception as e:
+            logger.warning(f"Could not read cache snapshot {path}: {e}")
+            return
+
+        now = time.time()
+        with self._lock:
+            for key, (expires_at, value) in entries:
+                if expires_at >= now:
+                    self._data[key] = (expires_at, value)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def save(self, path):
+        # Write atomically (temp file + rename) and only if something changed since the last save
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = [[key, list(entry)] for key, entry in self._data.items()]
+            self._dirty = False
+
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Could not write cache snapshot {path}: {e}")
+
+class ClientCache:
+    """
+    Holds one provider client (Twilio, SendGrid, ...) and rebuilds it only when the credentials
+    it was built from change. The cache itself only keeps a fingerprint of the credentials.
+    """
+
+    def __init__(self):
+        self._fingerprint = None
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get(self, credentials, factory):
+        fingerprint = hashlib.sha256('\0'.join(credentials).encode('utf-8')).hexdigest()
+        with self._lock:
+            if fingerprint != self._fingerprint or self._client is None:
+                self._client = factory()
+                self._fingerprint = fingerprint
+            return self._client
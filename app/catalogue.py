@@ -0,0 +1,140 @@
+import json
+import os
+import time
+import threading
+import logging
+from . import bcparks_api
+
+logger = logging.getLogger(__name__)
+
+# Optional local copy of https://camping.bcparks.ca/api/resourceLocation
+LOCAL_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'api', 'resourceLocation')
+
+# How long a live-fetched list is kept before re-fetching (the local file is reloaded on mtime change)
+CATALOGUE_TTL = int(os.environ.get('CATALOGUE_TTL', str(6 * 3600)))
+# Retry delay when neither the file nor the live API gave us anything
+EMPTY_RETRY_SECONDS = 60
+
+def display_name(cg):
+    # Short name preferred for the dashboard
+    if cg.get('localizedValues') and cg['localizedValues'][0].get('shortName'):
+        return cg['localizedValues'][0]['shortName']
+    elif cg.get('shortName'):
+        return cg['shortName']
+    elif cg.get('localizedValues') and cg['localizedValues'][0]:
+        return cg['localizedValues'][0]['fullName']
+    return 'Unknown'
+
+def full_name(cg):
+    # Full name preferred for notifications
+    if cg.get('localizedValues') and len(cg['localizedValues']) > 0:
+        return cg['localizedValues'][0]['fullName']
+    return cg.get('shortName')
+
+class CampgroundCatalogue:
+    """
+    The BC Parks campground list, parsed once per process and shared by every request.
+    Reloaded when the local file changes or, for a live fetch, after CATALOGUE_TTL.
+    Exposes prebuilt lookups so callers never re-parse or loop over the raw list.
+    """
+
+    def __init__(self, local_path=LOCAL_PATH, ttl=CATALOGUE_TTL):
+        self.local_path = local_path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._source_mtime = None
+        self._expires_at = 0
+        self._campgrounds = []
+        self._names = {}
+        self._full_names = {}
+        self._json_bytes = b'[]'
+
+    @property
+    def campgrounds(self):
+        self._ensure_fresh()
+        return self._campgrounds
+
+    @property
+    def names(self):
+        # resourceLocationId -> short display name
+        self._ensure_fresh()
+        return self._names
+
+    @property
+    def full_names(self):
+        # resourceLocationId -> full name
+        self._ensure_fresh()
+        return self._full_names
+
+    @property
+    def json_bytes(self):
+        # Pre-serialized list for /api/proxy/campgrounds
+        self._ensure_fresh()
+        return self._json_bytes
+
+    def _file_mtime(self):
+        try:
+            return os.path.getmtime(self.local_path)
+        except OSError:
+            return None
+
+    def _ensure_fresh(self):
+        mtime = self._file_mtime()
+        if mtime == self._source_mtime and time.time() < self._expires_at:
+            return
+        with self._lock:
+            # Another thread may have refreshed while we waited
+            mtime = self._file_mtime()
+            if mtime == self._source_mtime and time.time() < self._expires_at:
+                return
+            self._load(mtime)
+
+    def _load(self, mtime):
+        data = self._read_local() if mtime is not None else []
+        from_file = bool(data)
+
+        if not data:
+            # Fallback to fetching live
+            try:
+                resp = bcparks_api.get("/api/resourceLocation", timeout=10)
+                data = resp.json()
+            except:
+                data = []
+
+        if not isinstance(data, list):
+            data = []
+
+        self._campgrounds = data
+        self._names = {cg['resourceLocationId']: display_name(cg) for cg in data if 'resourceLocationId' in cg}
+        self._full_names = {cg['resourceLocationId']: full_name(cg) for cg in data if 'resourceLocationId' in cg}
+        self._json_bytes = json.dumps(data, separators=(',', ':')).encode('utf-8')
+        self._source_mtime = mtime
+
+        if from_file:
+            # File-backed: only an mtime change triggers a reload
+            self._expires_at = float('inf')
+        elif data:
+            self._expires_at = time.time() + self.ttl
+        else:
+            self._expires_at = time.time() + EMPTY_RETRY_SECONDS
+        logger.info(f"Loaded campground catalogue: {len(data)} campgrounds ({'file' if from_file else 'live'})")
+
+    def _read_local(self):
+        try:
+            with open(self.local_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except OSError:
+            return []
+        # Basic parsing if it contains the URL prefix
+        if "https" in content[:10]:
+            try:
+                json_text = content.split(': ', 1)[1]
+                return json.loads(json_text)
+            except:
+                return []
+        try:
+            return json.loads(content)
+        except:
+            return []
+
+campground_catalogue = CampgroundCatalogue()
@@ -1,40 +1,235 @@
 import json
+import hashlib
 import logging
-import requests
+import os
+import time
 import base64
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
 from . import db
-from .models import Alert
+from sqlalchemy.orm import joinedload
+from .models import Alert, User, SystemSetting
+from . import bcparks_api
+from .cache import TTLCache
+from .catalogue import campground_catalogue
+from .availability import AvailabilityMatrix, AvailabilityStreamParser
+from .findings import new_runs
+from .notifier import enqueue_notification, flush_outbox
+from .metrics import (SCAN_TICK_SECONDS, SCAN_STAGE_SECONDS, SCAN_MAPS, SCAN_MAPS_DUE, SCAN_MAPS_PLANNED,
+                      ALERTS_CHECKED, NOTIFICATIONS_SUPPRESSED, DB_COMMIT_SECONDS)
+from .sharding import shard_of, acquire_shards
+from .scheduling import ScanScheduler
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-HEADERS = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-}
-
 FIRST_RUN = True
 
+# Digest SMS are kept within 3 concatenated GSM segments (153 chars each)
+SMS_DIGEST_MAX_CHARS = 459
+
+# Max simultaneous availability requests to camping.bcparks.ca per scan tick
+SCAN_CONCURRENCY = int(os.environ.get('SCAN_CONCURRENCY', '4'))
+
+# Campground / site names used in notifications barely change, so keep them per process.
+# Optionally snapshotted to instance/ so a worker restart doesn't start cold.
+METADATA_CACHE_TTL = int(os.environ.get('METADATA_CACHE_TTL', str(24 * 3600)))
+METADATA_CACHE_SIZE = int(os.environ.get('METADATA_CACHE_SIZE', '512'))
+METADATA_CACHE_SNAPSHOT = os.environ.get('METADATA_CACHE_SNAPSHOT', 'true').lower() == 'true'
+
+metadata_cache = TTLCache(maxsize=METADATA_CACHE_SIZE, ttl=METADATA_CACHE_TTL)
+_metadata_snapshot_loaded = False
+
+# Incremental window fetching: the near-term part of each map's window changes most and is fetched
+# on every scan; the far-term rest is cached and re-fetched every SCAN_FAR_REFRESH scans of the map.
+SCAN_NEAR_DAYS = int(os.environ.get('SCAN_NEAR_DAYS', '30'))
+SCAN_FAR_REFRESH = int(os.environ.get('SCAN_FAR_REFRESH', '6'))
+
+# map_id -> (start, end, content hash, parsed AvailabilityMatrix, site ids it was parsed for (None: all), scans served)
+_far_segments = {}
+
+# Availability responses are hashed and parsed as they arrive, this many bytes at a time
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Per-map next-due times, churn and the per-tick request budget (see scheduling.py)
+scan_scheduler = ScanScheduler()
+
+# Response fingerprints from the previous scan of each map, for skipping unchanged maps.
+# map_id -> (window_start, window_end, content hash)
+_map_fingerprints = {}
+# alert_id -> (inputs incl. content hash, last_found_availability written by that evaluation)
+_alert_fingerprints = {}
+
+class ScanTick:
+    # State shared by every map and alert evaluated in one check_alerts run
+    def __init__(self, now, settings):
+        self.now = now
+        self.settings = settings # SystemSetting snapshot
+        self.map_fingerprints = {}
+        self.alert_fingerprints = {}
+        self.fast_path_maps = 0
+        self.digests = {} # user_id -> (user, [slot, ...]) for users in digest mode
+        self._campsite_ids = {} # alert_id -> frozenset of selected site ids
+        self.outbox = [] # notification rows, inserted in one statement before the commit
+
+    def campsite_ids(self, alert):
+        # Alert.campsite_ids parses JSON on every access; parse once per alert per tick
+        selected = self._campsite_ids.get(alert.id)
+        if selected is None:
+            selected = self._campsite_ids[alert.id] = frozenset(alert.campsite_ids)
+        return selected
+
 def check_alerts(app):
-    global FIRST_RUN
+    global FIRST_RUN, _metadata_snapshot_loaded
     with app.app_context():
-        alerts = Alert.query.filter_by(status='active').all()
-        logger.info(f"Checking {len(alerts)} active alerts... (First Run: {FIRST_RUN})")
-        
-        for alert in alerts:
-            check_alert(alert, is_first_run=FIRST_RUN)
-        
-        db.session.commit()
+        snapshot_path = os.path.join(app.instance_path, 'metadata_cache.json')
+        if METADATA_CACHE_SNAPSHOT and not _metadata_snapshot_loaded:
+            metadata_cache.load(snapshot_path)
+            _metadata_snapshot_loaded = True
+
+        # Scan-scoped unit of work: settings are read once, every change (scan state,
+        # queued notifications) accumulates on this session and is committed once at the end.
+        # The commit also runs if the tick dies part way, so work already done is kept.
+        tick = ScanTick(datetime.now().date(), SystemSetting.get_all())
+        tick_started = time.perf_counter()
+        # Scheduling time is taken once at the tick start, before the (variable) DB query and planning
+        now_ts = time.time()
+        try:
+            plan_started = time.perf_counter()
+            # Users and their contacts come with the alerts (one JOIN + one batched SELECT), so
+            # notifying alerts don't lazy-load them one by one
+            query = Alert.query.filter_by(status='active').options(
+                joinedload(Alert.user).selectinload(User.contacts)
+            )
+            # With WORKER_SHARDS > 1 each worker only scans the shards it holds a lease on
+            shards = acquire_shards()
+            if shards is not None:
+                if not shards:
+                    return
+                query = query.filter(shard_of(Alert.sub_campground_id).in_(shards))
+            alerts = query.all()
+            plan = plan_scan(alerts, tick.now)
+            
+            # Only maps that are due, within the request budget
+            base_seconds = int(tick.settings.get('SCAN_INTERVAL_MINUTES') or '5') * 60
+            # The budget counts upstream requests: 2 for a map whose far segment is due
+            wanted = {map_id: wanted_sites(jobs, tick) for map_id, (_, _, jobs) in plan.items()}
+            due = scan_scheduler.select(
+                plan, tick.now, now_ts, base_seconds,
+                cost=lambda map_id: fetch_requests(map_id, plan[map_id][0], plan[map_id][1], wanted[map_id])
+            )
+            forget_unplanned(plan)
+            SCAN_STAGE_SECONDS.labels('plan').observe(time.perf_counter() - plan_started)
+            SCAN_MAPS_PLANNED.set(len(plan))
+            SCAN_MAPS_DUE.set(len(due))
+            if not due:
+                return
+            logger.info(f"Checking {len(due)} due of {len(plan)} maps ({len(alerts)} active alerts)...")
+            
+            # One availability request per map, shared by every alert watching it.
+            # Fetches run on a bounded thread pool (network only, no DB access);
+            # evaluation and all DB writes stay on this thread and its session.
+            with ThreadPoolExecutor(max_workers=max(1, SCAN_CONCURRENCY)) as pool:
+                futures = {
+                    pool.submit(fetch_map, map_id, plan[map_id][0], plan[map_id][1], wanted[map_id]): map_id
+                    for map_id in due
+                }
+                for future in as_completed(futures):
+                    map_id = futures[future]
+                    fetched = future.result()
+                    if fetched is None:
+                        SCAN_MAPS.labels('failed').inc()
+                        scan_scheduler.record_failure(map_id, now_ts)
+                        continue
+                    with SCAN_STAGE_SECONDS.labels('evaluate').time():
+                        result = check_map(map_id, plan[map_id], fetched, tick, FIRST_RUN)
+                    SCAN_MAPS.labels(result).inc()
+                    if result == 'failed':
+                        scan_scheduler.record_failure(map_id, now_ts)
+                        continue
+                    scan_scheduler.record(map_id, plan[map_id][0], tick.now, now_ts, base_seconds, changed=result == 'changed')
+            
+            _map_fingerprints.update(tick.map_fingerprints)
+            _alert_fingerprints.update(tick.alert_fingerprints)
+            logger.info(f"Scan complete: {tick.fast_path_maps}/{len(due)} maps unchanged since their last scan (fast path)")
+        finally:
+            try:
+                # One digest message per contact for everything found this tick, then every
+                # queued notification in one INSERT, committed together with the scan state
+                flush_digests(tick)
+                flush_outbox(tick.outbox)
+                with DB_COMMIT_SECONDS.labels('scan').time():
+                    db.session.commit()
+            except Exception as e:
+                logger.error(f"Failed to commit scan results: {e}")
+                db.session.rollback()
+            SCAN_TICK_SECONDS.observe(time.perf_counter() - tick_started)
+
+        # Startup suppression is for the first scanning tick of the process only. Maps scanned later
+        # (deferred by the budget, taken over from another worker's shard) notify against each
+        # alert's stored state; alerts never scanned are still covered by has_previous_state.
         if FIRST_RUN:
             FIRST_RUN = False
 
-def check_alert(alert, is_first_run=False):
+        if METADATA_CACHE_SNAPSHOT:
+            metadata_cache.save(snapshot_path)
+
+def forget_unplanned(plan):
+    # Drop fingerprints and cached segments of maps/alerts no longer scanned (removed, paused, expired or another shard's)
+    alert_ids = {alert.id for _, _, jobs in plan.values() for alert in jobs}
+    for map_id in set(_map_fingerprints) - set(plan):
+        del _map_fingerprints[map_id]
+    for map_id in set(_far_segments) - set(plan):
+        del _far_segments[map_id]
+    for alert_id in set(_alert_fingerprints) - alert_ids:
+        del _alert_fingerprints[alert_id]
+
+def check_map(map_id, map_plan, fetched, tick, is_first_run=False):
+    """
+    Evaluate every alert of one map against its shared response and record its fingerprints.
+    Returns 'unchanged' if the map hit the fast path (same response as its last scan), 'changed',
+    or 'failed' if its response could not be used (scheduled like a failed fetch).
+    """
+    window_start, window_end, jobs = map_plan
+    digest, parts = fetched
+    
+    # Fast path: same bytes as last tick for the same window
+    map_key = (window_start, window_end, digest)
+    map_unchanged = _map_fingerprints.get(map_id) == map_key
+    
+    matrix = None
+    for alert in jobs:
+        alert_key = (digest,) + alert_inputs(alert, tick.now)
+        previous = _alert_fingerprints.get(alert.id)
+        if map_unchanged and previous == (alert_key, alert.last_found_availability):
+            # Nothing this alert depends on changed: same findings, nothing new to notify
+            alert.last_scanned_at = datetime.utcnow()
+            tick.alert_fingerprints[alert.id] = previous
+            ALERTS_CHECKED.labels('fast_path').inc()
+            continue
+        
+        if matrix is None:
+            try:
+                with SCAN_STAGE_SECONDS.labels('parse').time():
+                    matrix = build_matrix(parts, window_start, window_end)
+            except Exception as e:
+                logger.error(f"Failed to parse availability for map {map_id}: {e}")
+                return 'failed'
+        ALERTS_CHECKED.labels('evaluated').inc()
+        if check_alert(alert, is_first_run=is_first_run, matrix=matrix, tick=tick):
+            tick.alert_fingerprints[alert.id] = (alert_key, alert.last_found_availability)
+    
+    tick.map_fingerprints[map_id] = map_key
+    if map_unchanged:
+        tick.fast_path_maps += 1
+        return 'unchanged'
+    return 'changed'
+
+def get_scan_window(alert, now):
     # 5 Month Hard Limit Check
-    now = datetime.now().date()
     limit = now + timedelta(days=150) # Approx 5 months
     
-    # Adjust scan window to bounds
     # Adjust scan window to bounds
     # Extend scan_end by min_nights to ensure we catch bookings starting ON the last day
     extended_end_date = alert.end_date + timedelta(days=alert.min_nights)
@@ -42,125 +237,209 @@ def check_alert(alert, is_first_run=False):
     scan_start = max(alert.start_date, now)
     scan_end = min(extended_end_date, limit)
     
-    if scan_start > alert.end_date: # If the check window is purely in the past/invalid
-         return
+    if scan_start > alert.end_date or scan_start > scan_end: # If the check window is purely in the past/invalid
+        return None
+    return scan_start, scan_end
 
-    # API Request
-    # Note: mapId is stored in sub_campground_id (from our recent fix)
-    map_id = alert.sub_campground_id 
-    if not map_id:
-        return # Should not happen if correctly created
+def plan_scan(alerts, now):
+    """
+    Group alerts by mapId so each map is fetched once per tick.
+    Returns {map_id: (window_start, window_end, [alerts])} where the window is the
+    union of the alerts' scan windows (already clamped to the 150 day limit).
+    """
+    plan = {}
+    for alert in alerts:
+        # Note: mapId is stored in sub_campground_id (from our recent fix)
+        map_id = alert.sub_campground_id
+        if not map_id:
+            continue # Should not happen if correctly created
+        window = get_scan_window(alert, now)
+        if not window:
+            continue
+        
+        if map_id in plan:
+            start, end, jobs = plan[map_id]
+            plan[map_id] = (min(start, window[0]), max(end, window[1]), jobs)
+        else:
+            plan[map_id] = (window[0], window[1], [])
+        plan[map_id][2].append(alert)
+    return plan
+
+def alert_inputs(alert, now):
+    # Everything besides the map response that check_alert's result depends on
+    return (get_scan_window(alert, now), alert.end_date, alert.min_nights, alert._campsite_ids)
+
+def parse_availability(content, start):
+    return AvailabilityMatrix.from_response(json.loads(content), start)
+
+def build_matrix(parts, window_start, window_end):
+    # parts: [(segment start, AvailabilityMatrix of that segment)]
+    matrices = [part for _, part in parts]
+    if len(matrices) == 1 and matrices[0].start_date == window_start:
+        return matrices[0]
+    return AvailabilityMatrix.stitch(matrices, window_start, (window_end - window_start).days + 1)
+
+def wanted_sites(jobs, tick):
+    # Site ids any of a map's alerts can match, or None if one of them watches every site
+    wanted = set()
+    for alert in jobs:
+        selected = tick.campsite_ids(alert)
+        if not selected:
+            return None
+        wanted |= selected
+    return frozenset(wanted)
+
+def _far_split(window_start, window_end):
+    # First day of the far segment, or None when the window is fetched in one request
+    split = window_start + timedelta(days=SCAN_NEAR_DAYS)
+    if SCAN_NEAR_DAYS <= 0 or SCAN_FAR_REFRESH <= 1 or window_end < split:
+        return None
+    return split
+
+def _usable_far_segment(map_id, split, window_end, wanted):
+    # The map's cached far segment if it can serve this scan, else None
+    cached = _far_segments.get(map_id)
+    if cached is None:
+        return None
+    far_start, far_end, _, _, far_wanted, uses = cached
+    covers_sites = far_wanted is None or (wanted is not None and wanted <= far_wanted)
+    if far_start <= split and far_end >= window_end and covers_sites and uses < SCAN_FAR_REFRESH:
+        return cached
+    return None
+
+def fetch_requests(map_id, window_start, window_end, wanted=None):
+    # Upstream requests fetch_map will make for this map now: 2 when the far segment is (re)fetched
+    split = _far_split(window_start, window_end)
+    if split is None or _usable_far_segment(map_id, split, window_end, wanted) is not None:
+        return 1
+    return 2
+
+def fetch_map(map_id, window_start, window_end, wanted=None):
+    with SCAN_STAGE_SECONDS.labels('fetch').time():
+        return _fetch_map(map_id, window_start, window_end, wanted)
+
+def _fetch_map(map_id, window_start, window_end, wanted=None):
+    """
+    Fetch a map's window for this tick as (combined hash, parts) for build_matrix, or None on failure.
+    The first SCAN_NEAR_DAYS are requested every time. The far rest of the window is re-requested
+    only every SCAN_FAR_REFRESH scans of the map (or when the window outgrows the cached copy,
+    or an alert now watches sites the cached copy skipped); in between the cached matrix is reused.
+    """
+    split = _far_split(window_start, window_end)
+    if split is None:
+        _far_segments.pop(map_id, None)
+        fetched = fetch_availability(map_id, window_start, window_end, wanted)
+        if fetched is None:
+            return None
+        return fetched[0], [(window_start, fetched[1])]
+
+    near = fetch_availability(map_id, window_start, split - timedelta(days=1), wanted)
+    if near is None:
+        return None
+
+    cached = _usable_far_segment(map_id, split, window_end, wanted)
+    if cached is not None:
+        far_start, far_end, far_digest, far_matrix, far_wanted, uses = cached
+        _far_segments[map_id] = (far_start, far_end, far_digest, far_matrix, far_wanted, uses + 1)
+    else:
+        far = fetch_availability(map_id, split, window_end, wanted)
+        if far is None:
+            return None
+        far_digest, far_matrix = far
+        _far_segments[map_id] = (split, window_end, far_digest, far_matrix, wanted, 1)
 
-    url = "https://camping.bcparks.ca/api/availability/map"
+    digest = hashlib.blake2b(f"{near[0]}:{far_digest}".encode('utf-8'), digest_size=16).hexdigest()
+    # Far first so the fresh near-term data wins where the segments overlap
+    return digest, [(split, far_matrix), (window_start, near[1])]
+
+def fetch_availability(map_id, start, end, wanted=None):
+    """
+    Returns (content hash, AvailabilityMatrix), or None on failure.
+    The body is hashed and parsed chunk by chunk as it arrives (AvailabilityStreamParser), so the
+    response is never decoded into a full JSON document; sites outside `wanted` are skipped.
+    The hash is over the whole body, whatever `wanted` is.
+    """
     params = {
         'mapId': map_id,
-        'startDate': scan_start.strftime('%Y-%m-%d'),
-        'endDate': scan_end.strftime('%Y-%m-%d'),
+        'startDate': start.strftime('%Y-%m-%d'),
+        'endDate': end.strftime('%Y-%m-%d'),
         'getDailyAvailability': 'true'
     }
     
     try:
-        resp = requests.get(url, params=params, headers=HEADERS, timeout=20)
-        if resp.status_code != 200:
-            logger.error(f"Failed to fetch for alert {alert.id}: {resp.status_code}")
-            return
-            
-        data = resp.json()
-        res_avails = data.get('resourceAvailabilities', {})
-        
-        current_findings = {} # site_id -> [list of start_dates found]
-        
-        target_sites = alert.campsite_ids
-        
-        for res_id_str, daily_data in res_avails.items():
-            res_id = int(res_id_str)
-            
-            # Filter by selected sites (if any)
-            if target_sites and res_id not in target_sites:
-                continue
-                
-            # Check for consecutive nights
-            consecutive = 0
-            run_start_idx = -1
-            
-            for i, day in enumerate(daily_data):
-                # Calculate the date of this specific day
-                this_day_date = scan_start + timedelta(days=i)
-                
-                # Validation: If we are past the user's "Latest Arrival Date" + Min Nights, we don't care.
-                # Actually, we rely on consecutive counts. 
-                # CRITICAL: We only want to alert if the START date is <= alert.end_date.
-                
-                val = day.get('availability', -1)
-                is_avail = (val == 0) 
-                
-                if is_avail:
-                    if run_start_idx == -1:
-                        # This is the potential start date
-                        # Is this start date within valid arrival window?
-                        if this_day_date <= alert.end_date:
-                            run_start_idx = i
-                        else:
-                            # We started too late (after Latest Arrival Date)
-                            # Do not start a run here. Maximize loop efficiency? 
-                            # If we are past end_date, we can't start a NEW run.
-                            continue 
-                            
-                    consecutive += 1
-                else:
-                    # Check if run met criteria
-                    if consecutive >= alert.min_nights:
-                        add_finding(current_findings, res_id, scan_start, run_start_idx, consecutive)
-                    # Reset
-                    consecutive = 0
-                    run_start_idx = -1
-            
-            # Check end of list
-            if consecutive >= alert.min_nights:
-                 add_finding(current_findings, res_id, scan_start, run_start_idx, consecutive)
-
-        # Compare with previous
-        previous_findings = {}
-        has_previous_state = False
-        if alert.last_found_availability:
+        resp = bcparks_api.get('/api/availability/map', params=params, timeout=20, stream=True)
+        # The raw chunks are only kept for the json fallback; they are a fraction of the decoded document
+        chunks = []
+        try:
+            if resp.status_code != 200:
+                logger.error(f"Failed to fetch map {map_id}: {resp.status_code}")
+                return None
+            hasher = hashlib.blake2b(digest_size=16)
+            parser = AvailabilityStreamParser(start, wanted)
+            for chunk in resp.iter_content(STREAM_CHUNK_SIZE):
+                hasher.update(chunk)
+                chunks.append(chunk)
+                if parser is not None:
+                    try:
+                        parser.feed(chunk)
+                    except ValueError as e:
+                        logger.debug(f"Streaming parse of map {map_id} gave up: {e}")
+                        parser = None
+        finally:
+            resp.close()
+            bcparks_api.stream_finished('/api/availability/map', resp, sum(len(chunk) for chunk in chunks))
+
+        matrix = None
+        if parser is not None:
             try:
-                previous_findings = json.loads(alert.last_found_availability)
-                has_previous_state = True
-            except:
-                pass
+                matrix = parser.finish()
+            except ValueError as e:
+                logger.debug(f"Streaming parse of map {map_id} gave up: {e}")
+        if matrix is None:
+            matrix = parse_availability(b''.join(chunks), start)
+        return hasher.hexdigest(), matrix
+    except Exception as e:
+        logger.error(f"Error fetching map {map_id}: {e}")
+        return None
+
+def check_alert(alert, is_first_run=False, matrix=None, tick=None):
+    # matrix: the shared AvailabilityMatrix of this alert's map (from check_alerts) covering its window.
+    # If not given, the alert fetches its own window.
+    # tick: the ScanTick from check_alerts; a standalone check uses its own (and flushes its digests).
+    standalone = tick is None
+    if standalone:
+        tick = ScanTick(datetime.now().date(), SystemSetting.get_all())
+    window = get_scan_window(alert, tick.now)
+    if not window:
+        return
+    scan_start, scan_end = window
+
+    map_id = alert.sub_campground_id 
+    if not map_id:
+        return # Should not happen if correctly created
+
+    try:
+        if matrix is None:
+            fetched = fetch_availability(map_id, scan_start, scan_end, tick.campsite_ids(alert) or None)
+            if fetched is None:
+                return False
+            matrix = fetched[1]
         
-        # Detect NEW findings
-        new_notifications = []
+        # site_id -> [(start_ordinal, nights), ...]
+        # Runs must START on or before the user's "Latest Arrival Date" (alert.end_date)
+        current_findings = matrix.find_runs(scan_start, scan_end, alert.end_date, alert.min_nights, tick.campsite_ids(alert))
+
+        # Compare with previous (site_id -> set of (start_ordinal, nights), None if never scanned)
+        previous_findings = alert.found_runs
+        has_previous_state = previous_findings is not None
+        if not has_previous_state:
+            previous_findings = {}
         
-        for res_id, ranges in current_findings.items():
-            prev_ranges = previous_findings.get(str(res_id), [])
-            
-            for r in ranges: # r is string "YYYY-MM-DD:Nights"
-                if r not in prev_ranges:
-                    # CHECK FOR SLIDING WINDOW ARTIFACT (Bug Fix)
-                    is_shifted = False
-                    try:
-                        curr_date_str, curr_nights_str = r.split(':')
-                        curr_date = datetime.strptime(curr_date_str, '%Y-%m-%d').date()
-                        curr_nights = int(curr_nights_str)
-                        
-                        for pr in prev_ranges:
-                            prev_date_str, prev_nights_str = pr.split(':')
-                            prev_date = datetime.strptime(prev_date_str, '%Y-%m-%d').date()
-                            prev_nights = int(prev_nights_str)
-                            
-                            # Logic: If Current is exactly Previous + 1 Day, and End Dates match
-                            # Prev End = Prev Start + Prev Nights
-                            # Curr End = Curr Start + Curr Nights
-                            if (curr_date == prev_date + timedelta(days=1)) and \
-                               ((curr_date + timedelta(days=curr_nights)) == (prev_date + timedelta(days=prev_nights))):
-                                is_shifted = True
-                                break
-                    except:
-                        pass
-                    
-                    if not is_shifted:
-                        new_notifications.append((res_id, r))
+        # Detect NEW findings (ignoring sliding window artifacts)
+        new_notifications = [
+            (res_id, date.fromordinal(start), nights)
+            for res_id, start, nights in new_runs(current_findings, previous_findings)
+        ]
         
         # Suppress notification if:
         # 1. No new notifications (obviously)
@@ -172,9 +451,11 @@ def check_alert(alert, is_first_run=False):
             should_notify = False
         elif is_first_run:
             logger.info(f"Alert {alert.id}: Suppressing notifications (Startup Scan). Found {len(new_notifications)} new slots.")
+            NOTIFICATIONS_SUPPRESSED.labels('first_run').inc(len(new_notifications))
             should_notify = False
         elif not has_previous_state:
             logger.info(f"Alert {alert.id}: Suppressing notifications (First Alert Scan). Found {len(new_notifications)} new slots.")
+            NOTIFICATIONS_SUPPRESSED.labels('first_alert_scan').inc(len(new_notifications))
             should_notify = False
 
         if should_notify:
@@ -188,24 +469,37 @@ def check_alert(alert, is_first_run=False):
             # (Loop is already set up for individual processing in extract/format)
             # BUT we should probably reuse the connection?
             
-            send_notifications(alert, new_notifications, site_names, camp_name)
+            send_notifications(alert, new_notifications, site_names, camp_name, tick)
+            if standalone:
+                flush_digests(tick)
+                flush_outbox(tick.outbox)
 
         else:
             if new_notifications:
                 logger.info(f"Alert {alert.id}: State updated silently (Sliding Window or First Run).")
             
         # Update State
-        alert.last_found_availability = json.dumps(current_findings)
+        alert.found_runs = current_findings
         alert.last_scanned_at = datetime.utcnow()
+        return True
         
     except Exception as e:
         logger.error(f"Error checking alert {alert.id}: {e}")
+        return False
 
 def get_campground_name(campground_id):
+    cache_key = f"campground_name:{campground_id}"
+    name = metadata_cache.get(cache_key)
+    if name is None:
+        name = fetch_campground_name(campground_id)
+        if name is not None:
+            metadata_cache.set(cache_key, name)
+    return name
+
+def fetch_campground_name(campground_id):
     # Attempt 1: Direct Resource Location API
-    url = f"https://camping.bcparks.ca/api/resourcelocation/{campground_id}"
     try:
-        resp = requests.get(url, headers=HEADERS, timeout=10)
+        resp = bcparks_api.get(f"/api/resourcelocation/{campground_id}", timeout=10)
         if resp.status_code == 200:
             d = resp.json()
             if 'localizedValues' in d and len(d['localizedValues']) > 0:
@@ -213,27 +507,27 @@ def get_campground_name(campground_id):
     except:
         pass
         
-    # Attempt 2: Fetch All (Fallback)
+    # Attempt 2: Full campground list (Fallback), already indexed by the shared catalogue
     try:
-        resp = requests.get("https://camping.bcparks.ca/api/resourcelocation", headers=HEADERS, timeout=15)
-        if resp.status_code == 200:
-            all_camps = resp.json()
-            for c in all_camps:
-                # String comparison to be safe
-                if str(c.get('resourceLocationId')) == str(campground_id):
-                    if 'localizedValues' in c and len(c['localizedValues']) > 0:
-                        return c['localizedValues'][0]['fullName']
-                    elif 'shortName' in c:
-                        return c['shortName']
+        return campground_catalogue.full_names.get(int(campground_id))
     except:
         pass
         
     return None
 
 def get_site_names(campground_id):
-    url = f"https://camping.bcparks.ca/api/resourcelocation/resources?resourceLocationId={campground_id}"
+    cache_key = f"site_names:{campground_id}"
+    names = metadata_cache.get(cache_key)
+    if names is None:
+        names = fetch_site_names(campground_id)
+        # Don't cache failures (empty) so the next notification retries
+        if names:
+            metadata_cache.set(cache_key, names)
+    return names or {}
+
+def fetch_site_names(campground_id):
     try:
-        resp = requests.get(url, headers=HEADERS, timeout=15)
+        resp = bcparks_api.get("/api/resourcelocation/resources", params={'resourceLocationId': campground_id}, timeout=15)
         if resp.status_code != 200:
             return {}
         data = resp.json()
@@ -254,16 +548,6 @@ def get_site_names(campground_id):
         logger.warning(f"Failed to fetch site names: {e}")
         return {}
 
-def add_finding(findings, res_id, base_date, idx, nights):
-    # Calculate actual start date
-    start_date = base_date + timedelta(days=idx)
-    key = f"{start_date.strftime('%Y-%m-%d')}:{nights}"
-    
-    if res_id not in findings:
-        findings[res_id] = []
-    
-    findings[res_id].append(key)
-
 def shorten_booking_url(domain, campground_id, map_id, start_date, end_date, nights):
     """
     Create a shortened booking URL using base64 encoding.
@@ -277,91 +561,135 @@ def shorten_booking_url(domain, campground_id, map_id, start_date, end_date, nig
     protocol = 'https' if not domain.startswith('127.0.0.1') and not domain.startswith('localhost') else 'http'
     return f"{protocol}://{domain}/b?d={encoded}"
 
-def send_notifications(alert, notifications, site_names, camp_name):
-    # notifications: list of (res_id, "YYYY-MM-DD:Nights")
+def booking_url(alert, dt, end_dt, nights, settings):
+    if settings.get('URL_SHORTENING_ENABLED', 'false') == 'true':
+        # Use shortened URL
+        domain = settings.get('URL_SHORTENING_DOMAIN', '127.0.0.1:5000')
+        return shorten_booking_url(
+            domain,
+            alert.campground_id,
+            alert.sub_campground_id,
+            dt.strftime('%Y-%m-%d'),
+            end_dt.strftime('%Y-%m-%d'),
+            nights
+        )
+    # Use full URL
+    return (
+        f"https://camping.bcparks.ca/create-booking/results?"
+        f"resourceLocationId={alert.campground_id}&"
+        f"mapId={alert.sub_campground_id}&"
+        f"startDate={dt.strftime('%Y-%m-%d')}&"
+        f"endDate={end_dt.strftime('%Y-%m-%d')}&"
+        f"nights={nights}&"
+        f"bookingCategoryId=0&equipmentId=-32768&subEquipmentId=-32768"
+    )
+
+def send_notifications(alert, notifications, site_names, camp_name, tick):
+    # notifications: list of (res_id, start date, nights)
     
     logger.info(f"NOTIFICATION FOR ALERT {alert.id}: Found {len(notifications)} slots.")
     
     # Pre-fetch contacts
     user = alert.user
     contacts = user.contacts
-    from .models import SystemSetting
-    from .twilio_helper import send_sms
-    from .email_helper import send_email
     
-    for res_id, info in notifications:
-        date_str, nights = info.split(':')
-        dt = datetime.strptime(date_str, '%Y-%m-%d').date()
-        end_dt = dt + timedelta(days=int(nights))
-        
-        # Resolve Name (Lookup using STRING key)
-        site_label = site_names.get(str(res_id), str(res_id))
-        
-        # Check if URL shortening is enabled
-        url_shortening_enabled = SystemSetting.get_value('URL_SHORTENING_ENABLED', 'false') == 'true'
-        
-        if url_shortening_enabled:
-            # Use shortened URL
-            domain = SystemSetting.get_value('URL_SHORTENING_DOMAIN', '127.0.0.1:5000')
-            url = shorten_booking_url(
-                domain,
-                alert.campground_id,
-                alert.sub_campground_id,
-                dt.strftime('%Y-%m-%d'),
-                end_dt.strftime('%Y-%m-%d'),
-                nights
-            )
-        else:
-            # Use full URL
-            url = (
-                f"https://camping.bcparks.ca/create-booking/results?"
-                f"resourceLocationId={alert.campground_id}&"
-                f"mapId={alert.sub_campground_id}&"
-                f"startDate={dt.strftime('%Y-%m-%d')}&"
-                f"endDate={end_dt.strftime('%Y-%m-%d')}&"
-                f"nights={nights}&"
-                f"bookingCategoryId=0&equipmentId=-32768&subEquipmentId=-32768"
-            )
-        
+    slots = []
+    for res_id, dt, nights in notifications:
+        end_dt = dt + timedelta(days=nights)
+        slots.append({
+            'camp_name': camp_name,
+            # Resolve Name (Lookup using STRING key)
+            'site_label': site_names.get(str(res_id), str(res_id)),
+            'start': dt,
+            'end': end_dt,
+            'nights': nights,
+            # Settings come from the tick's snapshot (no query per message)
+            'url': booking_url(alert, dt, end_dt, nights, tick.settings)
+        })
+    
+    if user.notify_digest:
+        # Collected and sent as one message per contact when the tick finishes
+        if user.id not in tick.digests:
+            tick.digests[user.id] = (user, [])
+        tick.digests[user.id][1].extend(slots)
+        return
+    
+    for slot in slots:
         # EXACT Format requested:
         # Campsite Found! {Campground} site {Site #/Name}, {Day} {Start Month} {Start Day} - {End Month} {End Day} for {#} nights. {Link}
         msg = (
-            f"Campsite Found! {camp_name} site {site_label}, "
-            f"{dt.strftime('%a %b %d')} - {end_dt.strftime('%b %d')} "
-            f"for {nights} nights. {url}"
+            f"Campsite Found! {camp_name} site {slot['site_label']}, "
+            f"{slot['start'].strftime('%a %b %d')} - {slot['end'].strftime('%b %d')} "
+            f"for {slot['nights']} nights. {slot['url']}"
         )
         
-        logger.info(f"Sending notification: {camp_name} site {site_label} for {nights} nights")
+        logger.info(f"Queueing notification: {camp_name} site {slot['site_label']} for {slot['nights']} nights")
         
         subject = f"BC Parks: {camp_name} Available!"
 
-        for contact in contacts:
-            if contact.method_type == 'sms':
-                if contact.is_verified:
-                    # Check Limit
-                    sms_invoked = False
-                    sms_limit_enabled = SystemSetting.get_value('SMS_LIMIT_ENABLED', 'false') == 'true'
-                    if sms_limit_enabled:
-                         sms_max = int(SystemSetting.get_value('SMS_LIMIT_MAX', '0'))
-                         current_count = contact.sms_count or 0
-                         if current_count >= sms_max:
-                             logger.warning(f"SMS Limit Reached for {contact.value} ({current_count}/{sms_max}). Skipping.")
-                             continue
-                         else:
-                             # Increment
-                             contact.sms_count = current_count + 1
-                             sms_invoked = True
-                    
-                    # USE FULL MSG for SMS as requested
-                    if send_sms(contact.value, msg):
-                        if sms_invoked:
-                             db.session.commit() # Save the increment if successful
-                    else:
-                        pass
-                else:
-                    logger.warning(f"Skipping SMS to {contact.value} (Not Verified)")
-            
-            elif contact.method_type == 'email':
-                send_email(contact.value, subject, msg)
+        queue_for_contacts(contacts, subject, msg, msg, tick.outbox)
 
+def queue_for_contacts(contacts, subject, sms_body, email_body, outbox):
+    # Queued in the outbox (committed with the scan state); the dispatcher delivers
+    # them and applies the SMS limit at send time
+    for contact in contacts:
+        if contact.method_type == 'sms':
+            if contact.is_verified:
+                enqueue_notification(contact, None, sms_body, outbox)
+            else:
+                logger.warning(f"Skipping SMS to {contact.value} (Not Verified)")
+        
+        elif contact.method_type == 'email':
+            enqueue_notification(contact, subject, email_body, outbox)
+
+def flush_digests(tick):
+    for user, slots in tick.digests.values():
+        if not slots:
+            continue
+        logger.info(f"Queueing digest for user {user.id}: {len(slots)} slots")
+        subject = f"BC Parks: {len(slots)} campsite{'s' if len(slots) != 1 else ''} available!"
+        queue_for_contacts(user.contacts, subject, format_sms_digest(slots), format_email_digest(slots), tick.outbox)
+    tick.digests = {}
 
+def format_sms_digest(slots):
+    """
+    Fit as many slots as possible into SMS_DIGEST_MAX_CHARS (a few concatenated segments),
+    ending with a count of the rest and one booking link.
+    """
+    header = f"Campsites Found! {len(slots)} new:"
+    link = slots[0]['url']
+    lines = []
+    for i, slot in enumerate(slots):
+        line = (
+            f"{slot['camp_name']} site {slot['site_label']}, "
+            f"{slot['start'].strftime('%a %b %d')}-{slot['end'].strftime('%b %d')} {slot['nights']}n"
+        )
+        remaining = len(slots) - i - 1
+        more = f"+{remaining} more. " if remaining else ""
+        candidate = "\n".join([header] + lines + [line]) + f"\n{more}{link}"
+        if len(candidate) > SMS_DIGEST_MAX_CHARS and lines:
+            break
+        lines.append(line)
+    
+    remaining = len(slots) - len(lines)
+    more = f"+{remaining} more. " if remaining else ""
+    return "\n".join([header] + lines) + f"\n{more}{link}"
+
+def format_email_digest(slots):
+    rows = [(
+        slot['camp_name'],
+        str(slot['site_label']),
+        f"{slot['start'].strftime('%a %b %d')} - {slot['end'].strftime('%b %d')}",
+        str(slot['nights']),
+    ) for slot in slots]
+    headers = ('Campground', 'Site', 'Dates', 'Nights')
+    widths = [max(len(headers[i]), *(len(row[i]) for row in rows)) for i in range(len(headers))]
+    
+    def fmt(row):
+        return "  ".join(value.ljust(widths[i]) for i, value in enumerate(row)).rstrip()
+    
+    lines = [f"Campsites Found! {len(slots)} new openings:", "", fmt(headers), fmt(['-' * w for w in widths])]
+    for row, slot in zip(rows, slots):
+        lines.append(fmt(row))
+        lines.append(f"    {slot['url']}")
+    return "\n".join(lines)
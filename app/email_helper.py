@@ -1,43 +1,165 @@
+import os
+import time
+import smtplib
+import threading
 import logging
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
 from .models import SystemSetting
+from .cache import ClientCache
 
 logger = logging.getLogger(__name__)
 
+# Authenticated SMTP connections kept open between messages
+SMTP_POOL_SIZE = int(os.environ.get('SMTP_POOL_SIZE', '4'))
+SMTP_IDLE_TIMEOUT = int(os.environ.get('SMTP_IDLE_TIMEOUT', '60'))
+
+class SMTPPool:
+    """
+    Reuses authenticated SMTP connections across messages instead of paying connect + STARTTLS +
+    login per email. Connections are keyed by (host, port, user, password), so changing the admin
+    settings simply stops reusing the old ones. Idle connections past idle_timeout are closed.
+    """
+
+    def __init__(self, max_idle=SMTP_POOL_SIZE, idle_timeout=SMTP_IDLE_TIMEOUT):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self._idle = [] # [(key, server, released_at)]
+        self._lock = threading.Lock()
+
+    def acquire(self, host, port, user, password):
+        key = (host, int(port), user, password)
+        now = time.monotonic()
+        stale = []
+        server = None
+        with self._lock:
+            keep = []
+            for entry in self._idle:
+                entry_key, entry_server, released_at = entry
+                if entry_key != key or now - released_at > self.idle_timeout:
+                    stale.append(entry_server)
+                elif server is None:
+                    server = entry_server
+                else:
+                    keep.append(entry)
+            self._idle = keep
+
+        for s in stale:
+            self._close(s)
+        if server is None:
+            server = self._connect(*key)
+        return key, server
+
+    def release(self, key, server):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append((key, server, time.monotonic()))
+                return
+        self._close(server)
+
+    def discard(self, server):
+        self._close(server)
+
+    def _connect(self, host, port, user, password):
+        server = smtplib.SMTP(host, port, timeout=30)
+        server.starttls()
+        server.login(user, password)
+        return server
+
+    def _close(self, server):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+smtp_pool = SMTPPool()
+sendgrid_clients = ClientCache()
+
 def send_email(to_addr, subject, body):
+    return send_emails([(to_addr, subject, body)])[0]
+
+def send_emails(messages):
+    """
+    Send [(to_addr, subject, body), ...] and return a list of True/False per message.
+    For SMTP the whole batch goes over one pooled, already-authenticated connection.
+    """
     provider = SystemSetting.get_value('EMAIL_PROVIDER', 'smtp')
     from_addr = SystemSetting.get_value('EMAIL_FROM')
-    
+
+    if provider == 'sendgrid':
+        api_key = SystemSetting.get_value('SENDGRID_API_KEY')
+        if api_key and from_addr:
+            return [_send_sendgrid(api_key, from_addr, to_addr, subject, body) for to_addr, subject, body in messages]
+    else:
+        # SMTP
+        host = SystemSetting.get_value('EMAIL_HOST')
+        port = SystemSetting.get_value('EMAIL_PORT')
+        user_email = SystemSetting.get_value('EMAIL_USER')
+        password = SystemSetting.get_value('EMAIL_PASSWORD')
+
+        if host and port and user_email and password:
+            return _send_smtp(host, port, user_email, password, from_addr or user_email, messages)
+
+    logger.warning("Email provider not configured")
+    return [False] * len(messages)
+
+def _send_sendgrid(api_key, from_addr, to_addr, subject, body):
     try:
-        if provider == 'sendgrid':
-             api_key = SystemSetting.get_value('SENDGRID_API_KEY')
-             if api_key and from_addr:
-                from sendgrid import SendGridAPIClient
-                from sendgrid.helpers.mail import Mail
-                message = Mail(from_email=from_addr, to_emails=to_addr, subject=subject, plain_text_content=body)
-                sg = SendGridAPIClient(api_key)
-                sg.send(message)
-        else:
-            # SMTP
-            host = SystemSetting.get_value('EMAIL_HOST')
-            port = SystemSetting.get_value('EMAIL_PORT')
-            user_email = SystemSetting.get_value('EMAIL_USER')
-            password = SystemSetting.get_value('EMAIL_PASSWORD')
-            
-            if host and port and user_email and password:
-                import smtplib
-                from email.mime.text import MIMEText
-                from email.mime.multipart import MIMEMultipart
-                
-                email_msg = MIMEMultipart()
-                email_msg['From'] = from_addr or user_email
-                email_msg['To'] = to_addr
-                email_msg['Subject'] = subject
-                email_msg.attach(MIMEText(body, 'plain'))
-                
-                server = smtplib.SMTP(host, int(port))
-                server.starttls()
-                server.login(user_email, password)
-                server.send_message(email_msg)
-                server.quit()
+        from sendgrid import SendGridAPIClient
+        from sendgrid.helpers.mail import Mail
+        message = Mail(from_email=from_addr, to_emails=to_addr, subject=subject, plain_text_content=body)
+        # Built once and reused until the API key changes
+        sg = sendgrid_clients.get((api_key,), lambda: SendGridAPIClient(api_key))
+        sg.send(message)
+        return True
     except Exception as e:
         logger.error(f"Email failed: {e}")
+        return False
+
+def _send_smtp(host, port, user_email, password, from_addr, messages):
+    results = []
+    key = server = None
+    for to_addr, subject, body in messages:
+        email_msg = MIMEMultipart()
+        email_msg['From'] = from_addr
+        email_msg['To'] = to_addr
+        email_msg['Subject'] = subject
+        email_msg.attach(MIMEText(body, 'plain'))
+
+        sent = False
+        # A pooled connection may have been dropped by the server; reconnect once and retry
+        for attempt in range(2):
+            if server is None:
+                try:
+                    key, server = smtp_pool.acquire(host, port, user_email, password)
+                except Exception as e:
+                    # Unreachable host or bad credentials: the rest of the batch would only fail the same way, slowly
+                    logger.error(f"Email failed, no SMTP connection to {host}:{port}: {e}")
+                    return results + [False] * (len(messages) - len(results))
+            try:
+                server.send_message(email_msg)
+                sent = True
+                break
+            except smtplib.SMTPServerDisconnected as e:
+                error = e
+            except smtplib.SMTPException as e:
+                # Refused by the server (sender, recipients, content): only this message fails, the connection is fine
+                logger.error(f"Email to {to_addr} failed: {e}")
+                break
+            except OSError as e:
+                error = e
+            except Exception as e:
+                logger.error(f"Email failed: {e}")
+                break
+            smtp_pool.discard(server)
+            server = None
+            if attempt == 1:
+                logger.error(f"Email failed: {error}")
+        results.append(sent)
+
+    if server is not None:
+        smtp_pool.release(key, server)
+    return results
@@ -0,0 +1,113 @@
+import json
+from datetime import datetime
+from .metrics import NOTIFICATIONS_SUPPRESSED
+
+# Compact storage for Alert.last_found_availability.
+#
+# A finding is a run (start day, nights) for a site. Reported runs are maximal, so two runs of
+# the same site are never adjacent and a site's runs can be stored losslessly as one bitset of
+# the days they cover. Bit i means day (epoch + i), with the epoch stored once per alert:
+#
+#     b1:<epoch ordinal>:<site>=<hex bits>;<site>=<hex bits>
+#
+# Older rows hold the legacy JSON dict {"site": ["YYYY-MM-DD:N", ...]}; those are still read
+# and get rewritten in the compact format on the alert's next scan.
+
+FORMAT_PREFIX = 'b1:'
+
+def parse_run(value):
+    date_str, nights_str = value.split(':')
+    return datetime.strptime(date_str, '%Y-%m-%d').date().toordinal(), int(nights_str)
+
+def encode_findings(findings):
+    """ {site: [(start_ordinal, nights), ...]} -> compact string """
+    starts = [start for runs in findings.values() for start, _ in runs]
+    epoch = min(starts) if starts else 0
+
+    parts = []
+    for site, runs in findings.items():
+        bits = 0
+        for start, nights in runs:
+            bits |= ((1 << nights) - 1) << (start - epoch)
+        if bits:
+            parts.append(f"{site}={bits:x}")
+    return f"{FORMAT_PREFIX}{epoch}:{';'.join(parts)}"
+
+def decode_findings(value):
+    """
+    Compact string (or legacy JSON) -> {site: set of (start_ordinal, nights)}.
+    Returns None when there is no usable previous state.
+    """
+    if not value:
+        return None
+
+    if value.startswith(FORMAT_PREFIX):
+        try:
+            epoch_str, body = value[len(FORMAT_PREFIX):].split(':', 1)
+            epoch = int(epoch_str)
+            findings = {}
+            for part in body.split(';') if body else []:
+                site_str, bits_str = part.split('=')
+                findings[int(site_str)] = bits_to_runs(int(bits_str, 16), epoch)
+            return findings
+        except (ValueError, TypeError):
+            return None
+
+    # Legacy JSON
+    try:
+        legacy = json.loads(value)
+    except ValueError:
+        return None
+    if not isinstance(legacy, dict):
+        return None
+
+    findings = {}
+    for site_str, ranges in legacy.items():
+        runs = set()
+        for r in ranges:
+            try:
+                runs.add(parse_run(r))
+            except (ValueError, TypeError):
+                pass
+        findings[int(site_str)] = runs
+    return findings
+
+def new_runs(current, previous):
+    """
+    Runs in current that were not already reported in previous, as [(site, start_ordinal, nights)].
+
+    A run that only lost its first day since the last scan (start moved forward by one, same end)
+    is the scan window sliding past today, not a new opening, and is skipped too. Runs of one site
+    never overlap, so (site, end) identifies a previous run and both checks are one dict lookup.
+    """
+    prev_start_by_end = {
+        (site, start + nights): start
+        for site, runs in previous.items()
+        for start, nights in runs
+    }
+
+    found = []
+    sliding = 0
+    for site, runs in current.items():
+        for start, nights in runs:
+            prev_start = prev_start_by_end.get((site, start + nights))
+            if prev_start == start:
+                continue
+            if prev_start == start - 1:
+                sliding += 1
+                continue
+            found.append((site, start, nights))
+    if sliding:
+        NOTIFICATIONS_SUPPRESSED.labels('sliding_window').inc(sliding)
+    return found
+
+def bits_to_runs(bits, epoch):
+    # Split a day bitset back into its maximal runs of set bits
+    runs = set()
+    while bits:
+        low = (bits & -bits).bit_length() - 1
+        shifted = bits >> low
+        nights = (shifted ^ (shifted + 1)).bit_length() - 1
+        runs.add((epoch + low, nights))
+        bits &= ~(((1 << nights) - 1) << low)
+    return runs
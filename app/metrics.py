@@ -0,0 +1,226 @@
+import os
+import hmac
+import time
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Minimal in-process metrics in the Prometheus text format.
+# Each process keeps its own values, so only the scan worker serves them (a small HTTP server on
+# METRICS_PORT). The web app has none: a scrape would hit whichever gunicorn worker answered and
+# its counters would jump between processes. With METRICS_TOKEN set, scrapes must send it as a
+# bearer token.
+
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '9100'))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class _Timer:
+    def __init__(self, metric):
+        self.metric = metric
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metric.observe(time.perf_counter() - self.start)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = self._children[values] = self._new_child()
+            return child
+
+    def _default(self):
+        # Unlabelled metrics are used directly
+        return self.labels()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in children:
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def render(self, name, labelnames, values):
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(self.value)}"]
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+class _GaugeChild(_CounterChild):
+    def set(self, value):
+        with self._lock:
+            self.value = value
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default().set(value)
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # last one is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+    def render(self, name, labelnames, values):
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(list(self.buckets) + [float('inf')], counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labelnames, values, [('le', _format_value(bound))])} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {cumulative}")
+        return lines
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, description, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, description, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+def render():
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        if METRICS_TOKEN and not hmac.compare_digest(self.headers.get('Authorization', ''), f"Bearer {METRICS_TOKEN}"):
+            self.send_error(401)
+            return
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Scrapes would flood the worker log
+
+def start_metrics_server(port=METRICS_PORT):
+    # Serves /metrics from a daemon thread (used by the scan worker, which has no web server)
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer(('0.0.0.0', port), _MetricsHandler)
+    except OSError as e:
+        # E.g. a second worker on the same host with the same METRICS_PORT: keep working without metrics
+        logger.warning(f"Metrics server not started on :{port}: {e} (give each worker process its own METRICS_PORT)")
+        return None
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    logger.info(f"Metrics available on :{port}/metrics")
+    return server
+
+# Scan pipeline
+SCAN_TICK_SECONDS = Histogram('bcparks_scan_tick_seconds', 'Duration of a whole scan tick')
+SCAN_STAGE_SECONDS = Histogram('bcparks_scan_stage_seconds', 'Time spent per scan stage', ['stage'])
+SCAN_MAPS = Counter('bcparks_scan_maps_total', 'Maps scanned, by result', ['result'])
+SCAN_MAPS_DUE = Gauge('bcparks_scan_maps_due', 'Maps fetched in the last tick')
+SCAN_MAPS_PLANNED = Gauge('bcparks_scan_maps_planned', 'Maps with active alerts in the last tick')
+ALERTS_CHECKED = Counter('bcparks_alerts_checked_total', 'Alert evaluations, by path', ['path'])
+
+# Upstream API
+UPSTREAM_REQUEST_SECONDS = Histogram('bcparks_upstream_request_seconds', 'Latency of requests to camping.bcparks.ca', ['endpoint'])
+UPSTREAM_RESPONSES = Counter('bcparks_upstream_responses_total', 'Responses from camping.bcparks.ca by status', ['endpoint', 'status'])
+UPSTREAM_BYTES = Counter('bcparks_upstream_response_bytes_total', 'Response bytes from camping.bcparks.ca', ['endpoint'])
+
+# Notifications
+NOTIFICATIONS_QUEUED = Counter('bcparks_notifications_queued_total', 'Notifications added to the outbox', ['method'])
+NOTIFICATIONS_SUPPRESSED = Counter('bcparks_notifications_suppressed_total', 'Findings or messages not notified, by reason', ['reason'])
+NOTIFICATIONS_DELIVERED = Counter('bcparks_notifications_delivered_total', 'Outbox delivery attempts, by result', ['method', 'result'])
+
+# Database
+DB_COMMIT_SECONDS = Histogram('bcparks_db_commit_seconds', 'Duration of DB commits', ['stage'])
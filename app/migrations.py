@@ -0,0 +1,69 @@
+import logging
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError
+from . import db
+
+logger = logging.getLogger(__name__)
+
+# db.create_all() only creates missing tables, so columns and indexes added to existing models
+# later are added here. Each entry: table -> [(column, SQL type and default)]. SQLite can only
+# ADD COLUMN with a constant default, which is also what existing rows get.
+ADDED_COLUMNS = {
+    'user': [
+        ('notify_digest', 'BOOLEAN NOT NULL DEFAULT 0'),
+    ],
+    'contact_method': [
+        ('phone_e164', 'VARCHAR(20)'),
+    ],
+}
+
+def upgrade_schema():
+    """ Bring an existing database up to the current models. Safe to run on every start. """
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+
+    for table, columns in ADDED_COLUMNS.items():
+        if table not in tables:
+            continue
+        existing = {col['name'] for col in inspector.get_columns(table)}
+        for name, ddl in columns:
+            if name in existing:
+                continue
+            logger.info(f"Adding column {table}.{name}")
+            try:
+                db.session.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {name} {ddl}'))
+                db.session.commit()
+            except OperationalError as e:
+                # Another process (e.g. a second gunicorn worker) got there first
+                db.session.rollback()
+                logger.info(f"Skipped column {table}.{name}: {e.orig}")
+
+    if 'contact_method' in tables:
+        backfill_phone_e164()
+
+    # Indexes declared in the models' __table_args__
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                logger.info(f"Creating index {index.name}")
+                try:
+                    index.create(bind=db.engine, checkfirst=True)
+                except OperationalError as e:
+                    logger.info(f"Skipped index {index.name}: {e.orig}")
+
+def backfill_phone_e164():
+    # SMS contacts saved before phone_e164 existed (new and edited rows get it on save)
+    from .models import ContactMethod, normalize_phone
+    rows = db.session.query(ContactMethod.id, ContactMethod.value).filter(
+        ContactMethod.method_type == 'sms',
+        ContactMethod.phone_e164.is_(None)
+    ).all()
+    updates = [{'contact_id': row.id, 'phone': normalize_phone(row.value)} for row in rows]
+    updates = [u for u in updates if u['phone']]
+    if updates:
+        logger.info(f"Backfilling phone_e164 for {len(updates)} SMS contact(s)")
+        db.session.execute(text('UPDATE contact_method SET phone_e164 = :phone WHERE id = :contact_id'), updates)
+    db.session.commit()
@@ -2,13 +2,21 @@ from . import db
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+from sqlalchemy import event
 import json
+import os
+import re
+import threading
+import time
+from .findings import encode_findings, decode_findings
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(100), unique=True, nullable=False)
     password_hash = db.Column(db.String(200))
     is_admin = db.Column(db.Boolean, default=False)
+    # Digest mode: one message per contact per scan listing everything new, instead of one per slot
+    notify_digest = db.Column(db.Boolean, nullable=False, default=False)
     
     contacts = db.relationship('ContactMethod', backref='user', lazy=True, cascade="all, delete-orphan")
     alerts = db.relationship('Alert', backref='user', lazy=True, cascade="all, delete-orphan")
@@ -20,15 +28,46 @@ class User(UserMixin, db.Model):
         return check_password_hash(self.password_hash, password)
 
 class ContactMethod(db.Model):
+    __table_args__ = (
+        # A user's contacts (settings page, user.contacts)
+        db.Index('ix_contact_method_user_type_value', 'user_id', 'method_type', 'value'),
+        # Admin SMS limit reset and verify_phone, by normalized number
+        db.Index('ix_contact_method_phone_e164', 'phone_e164', 'user_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     method_type = db.Column(db.String(20), nullable=False) # 'email' or 'sms'
     value = db.Column(db.String(120), nullable=False)
+    phone_e164 = db.Column(db.String(20), nullable=True) # Normalized SMS number (see normalize_phone), set on save
     is_verified = db.Column(db.Boolean, default=False)
     sms_count = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+def normalize_phone(value):
+    """
+    E.164 form of a phone number as entered: 10 digits are North American (+1 added), anything
+    longer already carries its country code. Returns None if there are no digits.
+    """
+    digits = re.sub(r'\D', '', value or '')
+    if not digits:
+        return None
+    if len(digits) == 10:
+        return f"+1{digits}"
+    return f"+{digits}"
+
+@event.listens_for(ContactMethod, 'before_insert')
+@event.listens_for(ContactMethod, 'before_update')
+def _set_phone_e164(mapper, connection, contact):
+    contact.phone_e164 = normalize_phone(contact.value) if contact.method_type == 'sms' else None
+
 class Alert(db.Model):
+    __table_args__ = (
+        # Active alerts every scan tick (grouped/sharded by map), and a user's alerts on the dashboard
+        db.Index('ix_alert_status_map', 'status', 'sub_campground_id'),
+        db.Index('ix_alert_user_id', 'user_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
@@ -46,7 +85,7 @@ class Alert(db.Model):
 
     status = db.Column(db.String(20), default='active') # active, paused, triggered
     last_scanned_at = db.Column(db.DateTime, nullable=True)
-    last_found_availability = db.Column(db.Text, nullable=True) # JSON of what we last notified about
+    last_found_availability = db.Column(db.Text, nullable=True) # Compact runs we last saw (see findings.py), legacy rows hold JSON
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     @property
@@ -59,14 +98,103 @@ class Alert(db.Model):
     def campsite_ids(self, value):
         self._campsite_ids = json.dumps(value)
 
+    @property
+    def found_runs(self):
+        # {site_id: set of (start_ordinal, nights)}, or None if never scanned
+        return decode_findings(self.last_found_availability)
+
+    @found_runs.setter
+    def found_runs(self, value):
+        self.last_found_availability = encode_findings(value)
+
+class Notification(db.Model):
+    # Outbox: the scanner enqueues messages here, the worker's dispatcher (notifier.py) delivers them
+    __table_args__ = (
+        # Dispatcher: due pending rows, stale claims, and the rows of one claim
+        db.Index('ix_notification_status_next_attempt', 'status', 'next_attempt_at'),
+        db.Index('ix_notification_status_claimed', 'status', 'claimed_at'),
+        db.Index('ix_notification_claim_token', 'claim_token'),
+        # Retention purge of finished rows
+        db.Index('ix_notification_status_created', 'status', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    contact_id = db.Column(db.Integer, db.ForeignKey('contact_method.id'), nullable=True)
+    method_type = db.Column(db.String(20), nullable=False) # 'email' or 'sms'
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=True)
+    body = db.Column(db.Text, nullable=False)
+
+    status = db.Column(db.String(20), default='pending') # pending, sending, sent, failed, skipped
+    attempts = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    claim_token = db.Column(db.String(32), nullable=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class WorkerNode(db.Model):
+    # Scan worker membership for sharded scanning (see sharding.py)
+    worker_id = db.Column(db.String(100), primary_key=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=False)
+
+class ShardLease(db.Model):
+    # One row per shard (sharding.shard_of(sub_campground_id)); only the owner scans it until expires_at
+    shard = db.Column(db.Integer, primary_key=True)
+    owner = db.Column(db.String(100), nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True)
+
+# Settings are served from an in-process cache. set_value bumps a version row; every process
+# re-reads just that row at most every SETTINGS_CACHE_CHECK_SECONDS and reloads all settings
+# when it changed, so the web workers and the scan worker pick up admin changes within seconds.
+SETTINGS_VERSION_KEY = 'SETTINGS_VERSION'
+SETTINGS_CACHE_CHECK_SECONDS = float(os.environ.get('SETTINGS_CACHE_CHECK_SECONDS', '5'))
+
+class SettingsCache:
+    def __init__(self):
+        self.values = None
+        self.version = None
+        self.checked_at = 0
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        with self.lock:
+            self.values = None
+            self.checked_at = 0
+
+    def get_all(self):
+        now = time.monotonic()
+        if self.values is not None and now - self.checked_at < SETTINGS_CACHE_CHECK_SECONDS:
+            return self.values
+
+        with self.lock:
+            if self.values is not None and now - self.checked_at < SETTINGS_CACHE_CHECK_SECONDS:
+                return self.values
+            # Column queries bypass the session identity map, so we always see committed values
+            version = db.session.query(SystemSetting.value).filter_by(key=SETTINGS_VERSION_KEY).scalar()
+            if self.values is None or version != self.version:
+                rows = db.session.query(SystemSetting.key, SystemSetting.value).all()
+                self.values = {key: value for key, value in rows if key != SETTINGS_VERSION_KEY}
+                self.version = version
+            self.checked_at = now
+            return self.values
+
+settings_cache = SettingsCache()
+
 class SystemSetting(db.Model):
     key = db.Column(db.String(50), primary_key=True)
     value = db.Column(db.Text, nullable=True)
 
     @staticmethod
     def get_value(key, default=None):
-        setting = SystemSetting.query.get(key)
-        return setting.value if setting else default
+        values = settings_cache.get_all()
+        return values[key] if key in values else default
+
+    @staticmethod
+    def get_all():
+        # All settings as {key: value}
+        return dict(settings_cache.get_all())
     
     @staticmethod
     def set_value(key, value):
@@ -75,4 +203,16 @@ class SystemSetting(db.Model):
             setting = SystemSetting(key=key)
             db.session.add(setting)
         setting.value = value
+        SystemSetting.bump_version()
         db.session.commit()
+        settings_cache.invalidate()
+
+    @staticmethod
+    def bump_version():
+        # Atomic increment so concurrent writers in different processes never produce the same version
+        updated = SystemSetting.query.filter_by(key=SETTINGS_VERSION_KEY).update(
+            {SystemSetting.value: db.cast(db.func.coalesce(SystemSetting.value, '0'), db.Integer) + 1},
+            synchronize_session=False
+        )
+        if not updated:
+            db.session.add(SystemSetting(key=SETTINGS_VERSION_KEY, value='1'))
@@ -0,0 +1,247 @@
+import os
+import time
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import insert, update, func
+from . import db
+from . import sharding
+from .models import Notification, ContactMethod, SystemSetting
+from .metrics import NOTIFICATIONS_QUEUED, NOTIFICATIONS_SUPPRESSED, NOTIFICATIONS_DELIVERED, DB_COMMIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Notification outbox dispatcher.
+# The scanner only enqueues Notification rows (committed with the scan state), so scanning never
+# waits on SMTP/Twilio. The worker drains the outbox on its own job with per-provider concurrency
+# limits and retries. Rows are claimed before sending and re-queued if the claim goes stale, so a
+# restart mid-send never loses a message (delivery is at-least-once).
+# With sharded workers only the owner of shard 0 dispatches, so one process sends at a time.
+
+NOTIFY_BATCH_SIZE = int(os.environ.get('NOTIFY_BATCH_SIZE', '100'))
+NOTIFY_SMS_CONCURRENCY = int(os.environ.get('NOTIFY_SMS_CONCURRENCY', '2'))
+NOTIFY_EMAIL_CONCURRENCY = int(os.environ.get('NOTIFY_EMAIL_CONCURRENCY', '4'))
+NOTIFY_MAX_ATTEMPTS = int(os.environ.get('NOTIFY_MAX_ATTEMPTS', '5'))
+NOTIFY_RETRY_SECONDS = 30 # Backoff base: 30s, 60s, 120s, ...
+NOTIFY_CLAIM_TIMEOUT = timedelta(minutes=10)
+
+# Sent, skipped and failed rows are deleted after NOTIFY_RETENTION_DAYS (0 keeps them forever).
+# The purge runs from the dispatcher at most every NOTIFY_PURGE_SECONDS, in small batches so it never
+# holds the SQLite write lock for long.
+NOTIFY_RETENTION_DAYS = int(os.environ.get('NOTIFY_RETENTION_DAYS', '30'))
+NOTIFY_PURGE_SECONDS = 3600
+NOTIFY_PURGE_BATCH = 1000
+FINISHED_STATUSES = ('sent', 'skipped', 'failed')
+
+_next_purge = 0.0
+
+def enqueue_notification(contact, subject, body, outbox):
+    """
+    Queue a message for the dispatcher: the row is collected in outbox (a list) for one bulk
+    insert by flush_outbox, persisted by the caller's commit.
+    """
+    now = datetime.utcnow()
+    row = dict(
+        contact_id=contact.id,
+        method_type=contact.method_type,
+        recipient=contact.value,
+        subject=subject,
+        body=body,
+        status='pending',
+        attempts=0,
+        next_attempt_at=now,
+        created_at=now
+    )
+    NOTIFICATIONS_QUEUED.labels(contact.method_type).inc()
+    outbox.append(row)
+
+def flush_outbox(outbox):
+    # One executemany INSERT for every collected row, in the caller's transaction
+    if outbox:
+        db.session.execute(insert(Notification), outbox)
+        outbox.clear()
+
+def dispatch_notifications(app):
+    with app.app_context():
+        try:
+            if not sharding.is_dispatcher():
+                return
+            _purge_finished()
+            _requeue_stale_claims()
+            batch = _claim_batch()
+            if batch:
+                _deliver_batch(app, batch)
+        except Exception as e:
+            logger.error(f"Notification dispatch failed: {e}")
+            db.session.rollback()
+
+def _purge_finished():
+    global _next_purge
+    if NOTIFY_RETENTION_DAYS <= 0 or time.monotonic() < _next_purge:
+        return
+    _next_purge = time.monotonic() + NOTIFY_PURGE_SECONDS
+
+    cutoff = datetime.utcnow() - timedelta(days=NOTIFY_RETENTION_DAYS)
+    purged = 0
+    while True:
+        ids = [row.id for row in db.session.query(Notification.id).filter(
+            Notification.status.in_(FINISHED_STATUSES),
+            Notification.created_at < cutoff
+        ).limit(NOTIFY_PURGE_BATCH)]
+        if not ids:
+            break
+        Notification.query.filter(Notification.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        purged += len(ids)
+        if len(ids) < NOTIFY_PURGE_BATCH:
+            break
+    if purged:
+        logger.info(f"Purged {purged} finished notification(s) older than {NOTIFY_RETENTION_DAYS} days")
+
+def _requeue_stale_claims():
+    # Claims left behind by a dispatcher that died mid-send
+    cutoff = datetime.utcnow() - NOTIFY_CLAIM_TIMEOUT
+    requeued = Notification.query.filter(
+        Notification.status == 'sending',
+        Notification.claimed_at < cutoff
+    ).update({Notification.status: 'pending', Notification.claim_token: None}, synchronize_session=False)
+    if requeued:
+        logger.warning(f"Re-queued {requeued} notification(s) from a stale claim")
+    db.session.commit()
+
+def _claim_batch():
+    now = datetime.utcnow()
+    ids = [row.id for row in db.session.query(Notification.id).filter(
+        Notification.status == 'pending',
+        Notification.next_attempt_at <= now
+    ).order_by(Notification.id).limit(NOTIFY_BATCH_SIZE)]
+    if not ids:
+        return []
+
+    # Conditional update: a row only moves to 'sending' for one claimer, even across processes
+    token = uuid.uuid4().hex
+    Notification.query.filter(
+        Notification.id.in_(ids),
+        Notification.status == 'pending'
+    ).update({
+        Notification.status: 'sending',
+        Notification.claim_token: token,
+        Notification.claimed_at: now
+    }, synchronize_session=False)
+    db.session.commit()
+
+    return Notification.query.filter_by(claim_token=token).order_by(Notification.id).all()
+
+def _deliver_batch(app, batch):
+    settings = SystemSetting.get_all()
+    sms_limit_enabled = settings.get('SMS_LIMIT_ENABLED', 'false') == 'true'
+    sms_max = int(settings.get('SMS_LIMIT_MAX') or '0')
+
+    contact_ids = {n.contact_id for n in batch if n.contact_id}
+    contacts = {c.id: c for c in ContactMethod.query.filter(ContactMethod.id.in_(contact_ids))} if contact_ids else {}
+
+    now = datetime.utcnow()
+    futures = {}
+    emails = []
+    with ThreadPoolExecutor(max_workers=max(1, NOTIFY_SMS_CONCURRENCY)) as sms_pool, \
+         ThreadPoolExecutor(max_workers=max(1, NOTIFY_EMAIL_CONCURRENCY)) as email_pool:
+        for notification in batch:
+            contact = contacts.get(notification.contact_id)
+            if notification.method_type == 'sms':
+                if not contact or not contact.is_verified:
+                    _finish(notification, 'skipped', 'Contact removed or not verified')
+                    continue
+                # Reserve the SMS against the limit now so a batch can't overshoot it
+                if sms_limit_enabled and not _reserve_sms(contact.id, sms_max):
+                    logger.warning(f"SMS Limit Reached for {contact.value} (max {sms_max}). Skipping.")
+                    _finish(notification, 'skipped', 'SMS limit reached')
+                    NOTIFICATIONS_SUPPRESSED.labels('sms_limit').inc()
+                    continue
+                # Only plain values cross into the pool; ORM objects stay on this thread
+                futures[notification.id] = sms_pool.submit(_send_sms, app, notification.recipient, notification.body)
+            else:
+                emails.append(notification)
+
+        # Emails go out in one chunk per email thread, each chunk over a single pooled SMTP connection
+        chunk_size = max(1, -(-len(emails) // max(1, NOTIFY_EMAIL_CONCURRENCY)))
+        for i in range(0, len(emails), chunk_size):
+            chunk = emails[i:i + chunk_size]
+            chunk_future = email_pool.submit(_send_emails, app, [(n.recipient, n.subject, n.body) for n in chunk])
+            for position, notification in enumerate(chunk):
+                futures[notification.id] = (chunk_future, position)
+
+    sent = 0
+    for notification in batch:
+        future = futures.get(notification.id)
+        if future is None:
+            continue
+        if isinstance(future, tuple):
+            chunk_future, position = future
+            ok, error = chunk_future.result()[position]
+        else:
+            ok, error = future.result()
+        notification.attempts = (notification.attempts or 0) + 1
+        if ok:
+            notification.sent_at = now
+            _finish(notification, 'sent')
+            NOTIFICATIONS_DELIVERED.labels(notification.method_type, 'sent').inc()
+            sent += 1
+            continue
+
+        if notification.method_type == 'sms' and sms_limit_enabled:
+            # Give the reserved SMS back
+            db.session.execute(
+                update(ContactMethod)
+                .where(ContactMethod.id == notification.contact_id, ContactMethod.sms_count > 0)
+                .values(sms_count=ContactMethod.sms_count - 1)
+            )
+
+        if notification.attempts >= NOTIFY_MAX_ATTEMPTS:
+            _finish(notification, 'failed', error)
+            NOTIFICATIONS_DELIVERED.labels(notification.method_type, 'failed').inc()
+        else:
+            NOTIFICATIONS_DELIVERED.labels(notification.method_type, 'retry').inc()
+            notification.status = 'pending'
+            notification.claim_token = None
+            notification.last_error = error
+            notification.next_attempt_at = now + timedelta(seconds=NOTIFY_RETRY_SECONDS * 2 ** (notification.attempts - 1))
+
+    with DB_COMMIT_SECONDS.labels('dispatch').time():
+        db.session.commit()
+    logger.info(f"Dispatched {sent}/{len(batch)} notification(s)")
+
+def _reserve_sms(contact_id, sms_max):
+    # Count the SMS only if the contact is under the limit: one conditional UPDATE, committed on its
+    # own connection right away, so it holds across processes and no write lock is kept while sending
+    sms_count = func.coalesce(ContactMethod.sms_count, 0)
+    with db.engine.begin() as conn:
+        result = conn.execute(
+            update(ContactMethod)
+            .where(ContactMethod.id == contact_id, sms_count < sms_max)
+            .values(sms_count=sms_count + 1)
+        )
+    return result.rowcount == 1
+
+def _finish(notification, status, error=None):
+    notification.status = status
+    notification.claim_token = None
+    notification.last_error = error
+
+def _send_sms(app, recipient, body):
+    # Runs on a pool thread with its own app context (and so its own DB session)
+    from .twilio_helper import send_sms
+    with app.app_context():
+        try:
+            ok = send_sms(recipient, body)
+            return ok, None if ok else 'Send failed'
+        except Exception as e:
+            return False, str(e)
+
+def _send_emails(app, messages):
+    from .email_helper import send_emails
+    with app.app_context():
+        try:
+            return [(ok, None if ok else 'Send failed') for ok in send_emails(messages)]
+        except Exception as e:
+            return [(False, str(e))] * len(messages)
@@ -1,15 +1,18 @@
 
-from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify, current_app, session, send_file
+from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify, current_app, session, send_file, Response
 from flask_login import login_user, logout_user, login_required, current_user
 from . import db
 from .models import User
-import requests
+from . import bcparks_api
+from .catalogue import campground_catalogue
 import json
 import os
 import re
 import logging
 import base64
 from datetime import datetime
+from sqlalchemy import text
+from .migrations import upgrade_schema
 from itsdangerous import URLSafeTimedSerializer, SignatureExpired
 from .email_helper import send_email
 from .twilio_helper import send_sms
@@ -17,47 +20,12 @@ from .twilio_helper import send_sms
 main = Blueprint('main', __name__)
 logger = logging.getLogger(__name__)
 
-HEADERS = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-}
-
-
-def get_all_campgrounds():
-    # Attempt to read from local file first
-    local_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'api', 'resourceLocation')
-    data = []
-    if os.path.exists(local_path):
-        with open(local_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            # Basic parsing if it contains the URL prefix
-            if "https" in content[:10]:
-                try:
-                    json_text = content.split(': ', 1)[1]
-                    data = json.loads(json_text)
-                except:
-                    pass
-            else:
-                try:
-                    data = json.loads(content)
-                except:
-                    pass
-    
-    if not data:
-        # Fallback to fetching live
-        url = "https://camping.bcparks.ca/api/resourceLocation"
-        try:
-            resp = requests.get(url, headers=HEADERS, timeout=10)
-            data = resp.json()
-        except:
-            data = []
-    return data
 
 @main.route('/api/proxy/campgrounds')
 @login_required
 def proxy_campgrounds():
-    data = get_all_campgrounds()
-    return jsonify(data)
-
+    # Served from the pre-serialized catalogue, no JSON encode per request
+    return Response(campground_catalogue.json_bytes, mimetype='application/json')
 
 
 @main.route('/api/proxy/park_data/<resource_location_id>')
@@ -67,13 +35,11 @@ def proxy_park_data(resource_location_id):
     try:
         # Cast to int for safety inside logic if needed, but URL is string
         # 1. Get Maps (Visuals + Coordinates)
-        map_url = f"https://camping.bcparks.ca/api/maps?resourceLocationId={resource_location_id}"
-        map_resp = requests.get(map_url, headers=HEADERS, timeout=10)
+        map_resp = bcparks_api.get("/api/maps", params={'resourceLocationId': resource_location_id}, timeout=10)
         
         # 2. Get Resources (Site names, attributes)
         # Note: This can be large, but necessary for tooltips/filtering
-        res_url = f"https://camping.bcparks.ca/api/resourcelocation/resources?resourceLocationId={resource_location_id}"
-        res_resp = requests.get(res_url, headers=HEADERS, timeout=15)
+        res_resp = bcparks_api.get("/api/resourcelocation/resources", params={'resourceLocationId': resource_location_id}, timeout=15)
         
         return jsonify({
             "maps": map_resp.json(),
@@ -90,19 +56,8 @@ def index():
     from .models import Alert
     alerts = Alert.query.filter_by(user_id=current_user.id).all()
     
-    # Build campground name map
-    campgrounds = get_all_campgrounds()
-    campground_map = {}
-    for cg in campgrounds:
-        name = 'Unknown'
-        if cg.get('localizedValues') and cg['localizedValues'][0].get('shortName'):
-            name = cg['localizedValues'][0]['shortName']
-        elif cg.get('shortName'):
-            name = cg['shortName']
-        elif cg.get('localizedValues') and cg['localizedValues'][0]:
-            name = cg['localizedValues'][0]['fullName']
-            
-        campground_map[cg['resourceLocationId']] = name
+    # Campground name map (prebuilt by the catalogue)
+    campground_map = campground_catalogue.names
         
     # Settings for UI
     from .models import SystemSetting
@@ -221,7 +176,7 @@ def admin_users():
     users = User.query.all()
     return render_template('admin_users.html', users=users)
 
-from .models import User, SystemSetting
+from .models import User, SystemSetting, settings_cache
 
 @main.route('/admin/settings', methods=['GET', 'POST'])
 @login_required
@@ -257,35 +212,13 @@ def admin_settings():
         # Handle SMS Reset for specific number if provided
         reset_phone = request.form.get('RESET_PHONE_NUMBER')
         if reset_phone:
-            from .models import ContactMethod
-            # Normalize input: remove all non-digits
-            target_clean = re.sub(r'\D', '', reset_phone)
-            
-            # Retrieve ALL SMS contacts (inefficient for millions, fine for thousands)
-            # Better: query where method_type='sms'
-            all_sms = ContactMethod.query.filter_by(method_type='sms').all()
-            
-            count = 0
-            for c in all_sms:
-                # Normalize stored value
-                stored_clean = re.sub(r'\D', '', c.value)
-                
-                # Check for match (endswith to handle +1 country code differences if vague input)
-                # Or exact match? User said "including country code... or not".
-                # If target has 10 digits and stored has 11 (with 1), they match.
-                # If target has 11 and stored has 10, they match.
-                
-                match = False
-                if target_clean == stored_clean:
-                    match = True
-                elif len(target_clean) == 10 and len(stored_clean) == 11 and stored_clean.endswith(target_clean):
-                    match = True
-                elif len(target_clean) == 11 and len(stored_clean) == 10 and target_clean.endswith(stored_clean):
-                    match = True
-                    
-                if match:
-                    c.sms_count = 0
-                    count += 1
+            from .models import ContactMethod, normalize_phone
+            # Stored numbers are normalized on save, so this is one indexed UPDATE.
+            # 10 digits match the +1 number, with or without the country code on either side.
+            phone_e164 = normalize_phone(reset_phone)
+            count = ContactMethod.query.filter_by(phone_e164=phone_e164).update(
+                {ContactMethod.sms_count: 0}, synchronize_session=False
+            ) if phone_e164 else 0
             
             if count > 0:
                 db.session.commit()
@@ -297,8 +230,7 @@ def admin_settings():
         return redirect(url_for('main.admin_settings'))
     
     # Load all settings
-    settings_list = SystemSetting.query.all()
-    settings = {s.key: s.value for s in settings_list}
+    settings = SystemSetting.get_all()
     return render_template('admin_settings.html', settings=settings)
 
 @main.route('/settings', methods=['GET', 'POST'])
@@ -332,6 +264,11 @@ def settings():
                 db.session.commit()
                 flash('Contact method deleted')
         
+        elif action == 'update_preferences':
+            current_user.notify_digest = request.form.get('notify_digest') == 'on'
+            db.session.commit()
+            flash('Notification preferences saved')
+        
         return redirect(url_for('main.settings'))
 
 
@@ -432,10 +369,14 @@ def verify_phone():
     phone = data.get('phone')
     code = data.get('code')
     
-    from .models import ContactMethod
+    from .models import ContactMethod, normalize_phone
     from .twilio_helper import start_verification, check_verification
 
-    contacts = ContactMethod.query.filter_by(user_id=current_user.id, value=phone, method_type='sms').all()
+    # No digits means no number: filtering on phone_e164=None would match the user's email contacts
+    phone_e164 = normalize_phone(phone) if phone else None
+    contacts = ContactMethod.query.filter_by(
+        phone_e164=phone_e164, user_id=current_user.id, method_type='sms'
+    ).all() if phone_e164 else []
     logger.debug(f"Receiving verification request for phone={phone}, action={action}")
     
     if not contacts:
@@ -634,6 +575,9 @@ def export_db():
     
     db_path = os.path.join(current_app.instance_path, 'db.sqlite3')
     try:
+        # With WAL, recent commits may still be in db.sqlite3-wal: fold them into the main file first
+        db.session.execute(text('PRAGMA wal_checkpoint(TRUNCATE)'))
+        db.session.commit()
         return send_file(db_path, as_attachment=True, download_name='backup_db.sqlite3')
     except Exception as e:
         flash(f"Error exporting database: {str(e)}", "error")
@@ -665,11 +609,19 @@ def import_db():
         
         # Close any existing connections (Flask-SQLAlchemy handles this mostly per request, 
         # but we want to be safe before swapping the file out from under it)
+        # Empty the WAL first so none of its frames get applied to the imported file, and drop
+        # pooled connections so the next query opens the new file
+        db.session.execute(text('PRAGMA wal_checkpoint(TRUNCATE)'))
         db.session.remove()
+        db.engine.dispose()
         
         try:
             file.save(db_path)
             
+            # Older backups may predate newer tables/columns
+            db.create_all()
+            upgrade_schema()
+            
             # Re-connect/Re-query to restore admin
             # We need to commit the file save effectively by updating the DB session if needed, 
             # but file replacement happens at FS level.
@@ -690,7 +642,10 @@ def import_db():
                 user = User(username=admin_username, password_hash=admin_hash, is_admin=True)
                 db.session.add(user)
                 
+            # Settings came with the imported database: make every process reload them
+            SystemSetting.bump_version()
             db.session.commit()
+            settings_cache.invalidate()
             flash('Database imported successfully. Admin login preserved.', 'success')
             
         except Exception as e:
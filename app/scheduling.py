@@ -0,0 +1,108 @@
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Adaptive per-map scan scheduling.
+# The worker ticks every minute, but each map has its own next-due time. Its interval starts from
+# SCAN_INTERVAL_MINUTES and shrinks for maps whose alerts arrive soon (cancellations there are the
+# ones people can actually book) and for maps whose availability has been changing, and grows for
+# far-out, quiet maps. Each tick makes at most SCAN_BUDGET_PER_MINUTE upstream requests (a map whose
+# far segment is due costs two, see checker.fetch_requests), most overdue maps first, so a fixed
+# request budget goes where a booking is most likely to turn up.
+
+SCAN_BUDGET_PER_MINUTE = int(os.environ.get('SCAN_BUDGET_PER_MINUTE', '60'))
+MIN_SCAN_SECONDS = int(os.environ.get('MIN_SCAN_SECONDS', '60'))
+CHURN_SMOOTHING = 0.3 # weight of the latest scan in the churn average
+# The worker's scanner job interval. A map counts as due up to half a tick early: tick times jitter
+# by a few ms, and a map at a one-tick interval must not slip to every other tick because of it.
+# Intervals are effectively rounded to the nearest tick.
+TICK_SECONDS = 60
+
+# (days until the earliest arrival date, interval factor), first match wins
+PROXIMITY_FACTORS = (
+    (7, 0.25),
+    (30, 0.5),
+    (90, 1.0),
+)
+FAR_FACTOR = 2.0
+
+def proximity_factor(days_until_arrival):
+    for max_days, factor in PROXIMITY_FACTORS:
+        if days_until_arrival <= max_days:
+            return factor
+    return FAR_FACTOR
+
+class MapState:
+    def __init__(self):
+        self.next_due = 0.0 # epoch seconds; 0 = never scanned, due now
+        self.interval = 0.0
+        self.churn = 0.0 # moving average of "response changed since last scan", 0..1
+        self.scans = 0
+
+class ScanScheduler:
+    def __init__(self, budget=SCAN_BUDGET_PER_MINUTE, min_seconds=MIN_SCAN_SECONDS, tick_seconds=TICK_SECONDS):
+        self.budget = budget
+        self.min_seconds = min_seconds
+        self.tolerance = tick_seconds / 2
+        self.maps = {} # map_id -> MapState
+
+    def interval(self, base_seconds, days_until_arrival, churn):
+        seconds = base_seconds * proximity_factor(days_until_arrival) * (1.0 - 0.5 * churn)
+        return min(max(seconds, self.min_seconds), base_seconds * FAR_FACTOR)
+
+    def select(self, plan, today, now_ts, base_seconds, cost=None):
+        """
+        Pick the maps to fetch this tick from plan ({map_id: (window_start, window_end, alerts)}).
+        Due maps are ranked by how many of their own intervals overdue they are (never scanned
+        first), then by nearest arrival date, and cut to the budget of upstream requests.
+        cost(map_id) is the number of requests fetching a map takes (1 if not given).
+        """
+        # Forget maps nobody watches any more (alert removed, paused or moved to another shard)
+        for map_id in set(self.maps) - set(plan):
+            del self.maps[map_id]
+
+        due = []
+        for map_id, (window_start, _, _) in plan.items():
+            state = self.maps.get(map_id)
+            if state is None:
+                state = self.maps[map_id] = MapState()
+            if state.next_due > now_ts + self.tolerance:
+                continue
+            if state.scans == 0:
+                overdue = float('inf')
+            else:
+                overdue = (now_ts - state.next_due) / max(state.interval, 1.0)
+            due.append((-overdue, (window_start - today).days, map_id))
+
+        due.sort()
+        selected = []
+        spent = 0
+        for _, _, map_id in due:
+            requests = cost(map_id) if cost else 1
+            # In priority order; the first map always goes (unless the budget is 0) so a map costing
+            # more than the whole budget can't be starved
+            if self.budget <= 0 or (selected and spent + requests > self.budget):
+                break
+            selected.append(map_id)
+            spent += requests
+        if len(due) > len(selected):
+            logger.info(f"Scan budget: {len(selected)}/{len(due)} due maps fetched this tick ({spent} requests), rest deferred")
+        return selected
+
+    def record(self, map_id, window_start, today, now_ts, base_seconds, changed):
+        # changed: the response differs from this map's previous one
+        state = self.maps.get(map_id)
+        if state is None:
+            state = self.maps[map_id] = MapState()
+        if state.scans:
+            state.churn = (1 - CHURN_SMOOTHING) * state.churn + CHURN_SMOOTHING * (1.0 if changed else 0.0)
+        state.scans += 1
+        state.interval = self.interval(base_seconds, (window_start - today).days, state.churn)
+        state.next_due = now_ts + state.interval
+
+    def record_failure(self, map_id, now_ts):
+        # Fetch failed: try again after the map's interval rather than every tick
+        state = self.maps.get(map_id)
+        if state is not None:
+            state.next_due = now_ts + max(state.interval, self.min_seconds)
@@ -0,0 +1,150 @@
+import os
+import socket
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from . import db
+from .models import WorkerNode, ShardLease
+
+logger = logging.getLogger(__name__)
+
+# Sharded scanning: several worker processes split the maps between them.
+# A map belongs to shard shard_of(sub_campground_id), its id modulo WORKER_SHARDS. Live workers (recent heartbeat) divide
+# the shards by rendezvous hashing, so a worker joining or leaving only moves its own share. A worker
+# only scans shards it holds an unexpired lease on; leases are taken with a conditional UPDATE, so two
+# workers never own (and scan) the same shard at once. If a worker dies its heartbeat and leases
+# expire and the others pick its shards up at their next tick.
+#
+# WORKER_SHARDS=1 (the default) keeps the single-worker behaviour with no lease bookkeeping.
+
+WORKER_SHARDS = int(os.environ.get('WORKER_SHARDS', '1'))
+WORKER_LEASE_SECONDS = int(os.environ.get('WORKER_LEASE_SECONDS', '90'))
+WORKER_ID = os.environ.get('WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}"
+
+def sharding_enabled():
+    return WORKER_SHARDS > 1
+
+def shard_of(map_id):
+    # Also takes a column: shard_of(Alert.sub_campground_id) is the scanner's SQL filter.
+    # BC Parks map ids are negative and SQLite's % keeps the sign of the left side, so
+    # fold the remainder into 0..WORKER_SHARDS-1 the same way in SQL and in Python.
+    return ((map_id % WORKER_SHARDS) + WORKER_SHARDS) % WORKER_SHARDS
+
+def is_dispatcher():
+    """
+    Whether this worker drains the notification outbox: the holder of shard 0's lease, so only one
+    process sends at a time (with sharding off, always).
+    """
+    if not sharding_enabled():
+        return True
+    lease = ShardLease.query.get(0)
+    return lease is not None and lease.owner == WORKER_ID and lease.expires_at >= datetime.utcnow()
+
+def assigned_shards(worker_id, live_workers):
+    # Rendezvous hashing: each shard goes to the live worker with the highest score for it
+    def score(worker, shard):
+        return hashlib.sha1(f"{worker}:{shard}".encode('utf-8')).digest()
+    return {
+        shard for shard in range(WORKER_SHARDS)
+        if max(live_workers, key=lambda worker: score(worker, shard)) == worker_id
+    }
+
+def _heartbeat(now):
+    node = WorkerNode.query.get(WORKER_ID)
+    if node is None:
+        db.session.add(WorkerNode(worker_id=WORKER_ID, heartbeat_at=now))
+    else:
+        node.heartbeat_at = now
+
+def _ensure_shard_rows(now):
+    existing = {row.shard for row in db.session.query(ShardLease.shard)}
+    missing = set(range(WORKER_SHARDS)) - existing
+    if not missing:
+        return
+    for shard in missing:
+        db.session.add(ShardLease(shard=shard, owner=None, expires_at=now))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker created them first
+        db.session.rollback()
+
+def renew_leases():
+    """
+    Heartbeat and extend the leases this worker already holds. Runs on its own job so leases stay
+    alive through a long tick; it never claims or releases shards, that only happens between ticks.
+    """
+    if not sharding_enabled():
+        return
+    now = datetime.utcnow()
+    try:
+        _heartbeat(now)
+        ShardLease.query.filter(
+            ShardLease.owner == WORKER_ID,
+            ShardLease.expires_at >= now
+        ).update({ShardLease.expires_at: now + timedelta(seconds=WORKER_LEASE_SECONDS)}, synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        logger.error(f"Failed to renew shard leases: {e}")
+        db.session.rollback()
+
+def acquire_shards():
+    """
+    Rebalance at the start of a tick: release shards now assigned elsewhere, claim free or expired
+    ones assigned here, and return the set of shards this worker owns for the tick
+    (None when sharding is off, meaning everything).
+    """
+    if not sharding_enabled():
+        return None
+
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=WORKER_LEASE_SECONDS)
+    _ensure_shard_rows(now)
+    _heartbeat(now)
+    db.session.flush()
+
+    live_cutoff = now - timedelta(seconds=WORKER_LEASE_SECONDS)
+    live = [row.worker_id for row in db.session.query(WorkerNode.worker_id).filter(WorkerNode.heartbeat_at >= live_cutoff)]
+    mine = assigned_shards(WORKER_ID, live)
+
+    # Hand back shards another live worker should have now
+    ShardLease.query.filter(
+        ShardLease.owner == WORKER_ID,
+        ~ShardLease.shard.in_(mine)
+    ).update({ShardLease.owner: None, ShardLease.expires_at: now}, synchronize_session=False)
+
+    # Renew ours and take over assigned shards that are free or whose owner's lease ran out.
+    # Conditional update: a shard still leased by another worker is left alone until it lets go.
+    if mine:
+        ShardLease.query.filter(
+            ShardLease.shard.in_(mine),
+            or_(ShardLease.owner == WORKER_ID, ShardLease.owner.is_(None), ShardLease.expires_at < now)
+        ).update({ShardLease.owner: WORKER_ID, ShardLease.expires_at: expires_at}, synchronize_session=False)
+
+    # Forget workers that have been gone for a while
+    WorkerNode.query.filter(
+        WorkerNode.heartbeat_at < now - timedelta(seconds=10 * WORKER_LEASE_SECONDS)
+    ).delete(synchronize_session=False)
+    db.session.commit()
+
+    owned = {row.shard for row in db.session.query(ShardLease.shard).filter(ShardLease.owner == WORKER_ID)}
+    waiting = mine - owned
+    if waiting:
+        logger.info(f"Worker {WORKER_ID}: waiting for shard(s) {sorted(waiting)} to be released")
+    logger.info(f"Worker {WORKER_ID}: scanning shard(s) {sorted(owned)} of {WORKER_SHARDS} ({len(live)} live worker(s))")
+    return owned
+
+def release_shards():
+    # Graceful shutdown: let the other workers take over right away instead of after expiry
+    if not sharding_enabled():
+        return
+    try:
+        ShardLease.query.filter(ShardLease.owner == WORKER_ID).update(
+            {ShardLease.owner: None, ShardLease.expires_at: datetime.utcnow()}, synchronize_session=False)
+        WorkerNode.query.filter(WorkerNode.worker_id == WORKER_ID).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        logger.error(f"Failed to release shard leases: {e}")
+        db.session.rollback()
@@ -1,9 +1,12 @@
 from twilio.rest import Client
 from .models import SystemSetting
+from .cache import ClientCache
 import logging
 
 logger = logging.getLogger(__name__)
 
+twilio_clients = ClientCache()
+
 def get_twilio_client():
     sid = SystemSetting.get_value('TWILIO_ACCOUNT_SID')
     token = SystemSetting.get_value('TWILIO_AUTH_TOKEN')
@@ -12,8 +15,14 @@ def get_twilio_client():
         logger.error("Twilio credentials missing. Check TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN in admin settings.")
         return None
          
-    logger.debug(f"Initializing Twilio client with SID: {sid.strip()[:6]}...")
-    return Client(sid.strip(), token.strip())
+    sid, token = sid.strip(), token.strip()
+    
+    def build():
+        logger.debug(f"Initializing Twilio client with SID: {sid[:6]}...")
+        return Client(sid, token)
+    
+    # Built once and reused until the admin changes the credentials
+    return twilio_clients.get((sid, token), build)
 
 def send_sms(to, body):
     client = get_twilio_client()
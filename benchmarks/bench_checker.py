@@ -0,0 +1,190 @@
+"""
+Benchmark the scan pipeline (check_alerts) offline.
+
+Starts the stub BC Parks API (stub_server.py) in a separate process, creates a temporary SQLite
+database with a synthetic alert population and runs a few scan ticks against it, switching the
+stub's availability generation between ticks so every tick sees some churn. Reports per tick:
+wall time, time per scan stage (from app.metrics), maps and alerts scanned, notifications queued,
+and optionally tracemalloc allocations; plus the process peak RSS.
+
+    python benchmarks/bench_checker.py --alerts 1000
+    python benchmarks/bench_checker.py --alerts 100000 --maps 500 --ticks 3 --json results.json
+
+Run it on two commits with the same arguments to compare them.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import tracemalloc
+import multiprocessing
+import urllib.request
+from datetime import date, datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from stub_server import serve, load_fixture, FIXTURES_DIR
+
+STAGES = ('plan', 'fetch', 'parse', 'evaluate')
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--alerts', type=int, default=1000)
+    parser.add_argument('--maps', type=int, default=None, help='distinct maps (default: alerts / 20, at most 500)')
+    parser.add_argument('--sites', type=int, default=40, help='sites per map')
+    parser.add_argument('--users', type=int, default=None, help='users owning the alerts (default: alerts / 5)')
+    parser.add_argument('--ticks', type=int, default=3)
+    parser.add_argument('--churn', type=float, default=0.02, help='fraction of site-days changing between ticks')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--fixtures', default=FIXTURES_DIR)
+    parser.add_argument('--tracemalloc', action='store_true', help='track allocations (slows the run down)')
+    parser.add_argument('--json', help='also write the results to this file')
+    return parser.parse_args()
+
+def start_stub(args):
+    ready = multiprocessing.Queue()
+    stub = multiprocessing.Process(
+        target=serve,
+        kwargs=dict(port=0, sites=args.sites, churn=args.churn, seed=args.seed, fixtures_dir=args.fixtures, ready=ready),
+        daemon=True
+    )
+    stub.start()
+    return stub, ready.get(timeout=30)
+
+def populate(db, args, num_maps):
+    # Synthetic population: alert windows spread over the 150 day scan limit
+    from app.models import User, ContactMethod, Alert
+    rng = random.Random(args.seed)
+    today = date.today()
+    num_users = args.users or max(1, args.alerts // 5)
+    # Map ids shaped like the recorded ones (negative, just above -2**31), consecutive so every shard gets maps
+    first_map_id = load_fixture(args.fixtures, 'availability_map.json')['mapId']
+    map_ids = [first_map_id + i for i in range(num_maps)]
+
+    db.session.bulk_insert_mappings(User, [
+        {'id': i + 1, 'username': f'bench{i}', 'password_hash': '', 'is_admin': False, 'notify_digest': False}
+        for i in range(num_users)
+    ])
+    db.session.bulk_insert_mappings(ContactMethod, [
+        {'user_id': i + 1, 'method_type': 'email', 'value': f'bench{i}@example.com', 'is_verified': True, 'sms_count': 0}
+        for i in range(num_users)
+    ])
+
+    alerts = []
+    for i in range(args.alerts):
+        map_id = rng.choice(map_ids)
+        start = today + timedelta(days=rng.randint(0, 120))
+        end = start + timedelta(days=rng.randint(1, 30))
+        campsites = None
+        if rng.random() < 0.3:
+            campsites = json.dumps(rng.sample(range(map_id * 1000, map_id * 1000 + args.sites), k=min(args.sites, rng.randint(1, 5))))
+        alerts.append({
+            'user_id': rng.randint(1, num_users),
+            'campground_id': map_id,
+            'sub_campground_id': map_id,
+            'start_date': start,
+            'end_date': end,
+            'min_nights': rng.randint(1, 4),
+            '_campsite_ids': campsites,
+            'status': 'active',
+            'created_at': datetime.utcnow(),
+        })
+    db.session.bulk_insert_mappings(Alert, alerts)
+    db.session.commit()
+
+def stage_totals(metrics):
+    totals = {}
+    for stage in STAGES:
+        child = metrics.SCAN_STAGE_SECONDS.labels(stage)
+        totals[stage] = (child.sum, sum(child.counts))
+    return totals
+
+def counter_value(counter, *labels):
+    return counter.labels(*labels).value
+
+def main():
+    args = parse_args()
+    num_maps = args.maps or max(1, min(args.alerts // 20, 500))
+
+    stub, port = start_stub(args)
+    base_url = f"http://127.0.0.1:{port}"
+    workdir = tempfile.mkdtemp(prefix='bcparks-bench-')
+
+    # Configure the app before importing it (these are read at import time)
+    os.environ['BCPARKS_BASE_URL'] = base_url
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'bench.sqlite3')}"
+    os.environ['SKIP_DEFAULT_ADMIN'] = 'true'
+    os.environ['METADATA_CACHE_SNAPSHOT'] = 'false'
+    # Up to two requests per map (near + far segment)
+    os.environ['SCAN_BUDGET_PER_MINUTE'] = str(2 * num_maps)
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from app import create_app, db, metrics
+    from app import checker
+
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        populate(db, args, num_maps)
+        print(f"Populated {args.alerts} alerts over {num_maps} maps x {args.sites} sites in {time.perf_counter() - started:.1f}s")
+
+    results = {
+        'alerts': args.alerts, 'maps': num_maps, 'sites': args.sites, 'churn': args.churn, 'seed': args.seed,
+        'ticks': []
+    }
+    for tick in range(args.ticks):
+        urllib.request.urlopen(f"{base_url}/__bench/generation?value={tick}").read()
+        # Every map due every tick, so each tick measures a full scan
+        for state in checker.scan_scheduler.maps.values():
+            state.next_due = 0
+
+        before = stage_totals(metrics)
+        queued_before = counter_value(metrics.NOTIFICATIONS_QUEUED, 'email')
+        evaluated_before = counter_value(metrics.ALERTS_CHECKED, 'evaluated')
+        fast_before = counter_value(metrics.ALERTS_CHECKED, 'fast_path')
+        if args.tracemalloc:
+            tracemalloc.start()
+
+        started = time.perf_counter()
+        checker.check_alerts(app)
+        elapsed = time.perf_counter() - started
+
+        row = {'tick': tick, 'seconds': round(elapsed, 4)}
+        if args.tracemalloc:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            row['alloc_peak_mb'] = round(peak / 2**20, 2)
+            row['alloc_retained_mb'] = round(current / 2**20, 2)
+        after = stage_totals(metrics)
+        row['stages'] = {stage: round(after[stage][0] - before[stage][0], 4) for stage in STAGES}
+        row['alerts_evaluated'] = int(counter_value(metrics.ALERTS_CHECKED, 'evaluated') - evaluated_before)
+        row['alerts_fast_path'] = int(counter_value(metrics.ALERTS_CHECKED, 'fast_path') - fast_before)
+        row['notifications_queued'] = int(counter_value(metrics.NOTIFICATIONS_QUEUED, 'email') - queued_before)
+        results['ticks'].append(row)
+
+        stages = '  '.join(f"{stage}={row['stages'][stage]:.3f}s" for stage in STAGES)
+        alloc = f"  alloc peak={row['alloc_peak_mb']}MB" if args.tracemalloc else ''
+        print(
+            f"tick {tick}: {elapsed:.3f}s  {stages}  evaluated={row['alerts_evaluated']} "
+            f"fast_path={row['alerts_fast_path']} queued={row['notifications_queued']}{alloc}"
+        )
+
+    # ru_maxrss is in KB on Linux
+    results['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    print(f"peak RSS: {results['peak_rss_mb']} MB")
+    print("(fetch is summed over the scan threads, so it can exceed the tick time)")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+
+    stub.terminate()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Check that the hot queries use an index.
+
+Creates a temporary database through create_app (so the indexes come from the same migration
+step as production), runs EXPLAIN QUERY PLAN on the ORM queries the scanner, dispatcher and
+dashboard issue, and exits non-zero if any of them falls back to a full table scan.
+
+    python benchmarks/query_plans.py
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def hot_queries():
+    from app import db
+    from app.models import Alert, ContactMethod, Notification
+    now = datetime.utcnow()
+    return {
+        'scan: active alerts': Alert.query.filter_by(status='active'),
+        'scan: active alerts of some shards': Alert.query.filter_by(status='active').filter((((Alert.sub_campground_id % 4) + 4) % 4).in_([0, 2])),
+        'dashboard: user alerts': Alert.query.filter_by(user_id=1),
+        'settings: user contacts': ContactMethod.query.filter_by(user_id=1),
+        'verify_phone: contact lookup': ContactMethod.query.filter_by(phone_e164='+15551234567', user_id=1, method_type='sms'),
+        'admin: SMS limit reset': ContactMethod.query.filter_by(phone_e164='+15551234567'),
+        'dispatch: due notifications': db.session.query(Notification.id).filter(
+            Notification.status == 'pending', Notification.next_attempt_at <= now).order_by(Notification.id),
+        'dispatch: stale claims': Notification.query.filter(Notification.status == 'sending', Notification.claimed_at < now),
+        'dispatch: claimed batch': Notification.query.filter_by(claim_token='abc').order_by(Notification.id),
+        'dispatch: retention purge': db.session.query(Notification.id).filter(
+            Notification.status.in_(('sent', 'skipped', 'failed')), Notification.created_at < now),
+    }
+
+def explain(db, query):
+    compiled = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True})
+    params = [compiled.params[name] for name in compiled.positiontup]
+    conn = db.engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"EXPLAIN QUERY PLAN {compiled}", params)
+        return [row[-1] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+def is_full_scan(detail):
+    # "SCAN alert" is a table scan; "SCAN alert USING INDEX ..." walks an index
+    return detail.startswith('SCAN') and 'USING' not in detail
+
+def main():
+    workdir = tempfile.mkdtemp(prefix='bcparks-query-plans-')
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'plans.sqlite3')}"
+    os.environ['SKIP_DEFAULT_ADMIN'] = 'true'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    from app import create_app, db
+
+    app = create_app()
+    failures = 0
+    with app.app_context():
+        for name, query in hot_queries().items():
+            plan = explain(db, query)
+            scans = [detail for detail in plan if is_full_scan(detail)]
+            print(f"{'FAIL' if scans else 'ok  '} {name}: {'; '.join(plan)}")
+            failures += bool(scans)
+
+    if failures:
+        print(f"{failures} hot quer{'y' if failures == 1 else 'ies'} fall back to a table scan")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Check the pooled SMTP sending in app/email_helper.py against a local stand-in server.
+
+Starts a minimal in-process SMTP server (EHLO, AUTH, MAIL/RCPT/DATA, RSET, QUIT) on a free port,
+points the SMTP settings of a temporary database at it and drives send_emails through the real
+SMTPPool. Checks that:
+
+- a batch, and the next batch, go over one connection,
+- a connection dropped by the server is replaced and the batch still goes out,
+- a recipient the server refuses fails only that message and keeps the connection,
+- an unreachable host fails the whole batch at once instead of retrying every message.
+
+The stand-in has no TLS, so the pool used here skips STARTTLS; everything else is the production path.
+
+    python benchmarks/smtp_pool_check.py
+"""
+import os
+import sys
+import time
+import socket
+import tempfile
+import threading
+import socketserver
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode('ascii'))
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        sent_here = 0
+        self.reply('220 stub ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('ascii', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250-stub')
+                self.reply('250 AUTH PLAIN LOGIN')
+            elif verb == 'AUTH':
+                self.reply('235 2.7.0 Authentication successful')
+            elif verb == 'MAIL':
+                if server.drop_after and sent_here >= server.drop_after:
+                    # Idle/limit disconnect: close without a reply, like a server timing the connection out
+                    return
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                if 'reject' in command.lower():
+                    self.reply('550 5.1.1 No such user')
+                else:
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                sent_here += 1
+                with server.lock:
+                    server.delivered += 1
+                self.reply('250 OK queued')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubSMTPHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.delivered = 0
+        self.drop_after = 0 # close each connection after this many messages (0: never)
+
+    def reset(self, drop_after=0):
+        self.connections = self.delivered = 0
+        self.drop_after = drop_after
+
+def free_port():
+    # A port nothing listens on
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def main():
+    workdir = tempfile.mkdtemp(prefix='bcparks-smtp-check-')
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'smtp.sqlite3')}"
+    os.environ['SKIP_DEFAULT_ADMIN'] = 'true'
+    os.environ.setdefault('LOG_LEVEL', 'CRITICAL')
+    from app import create_app
+    from app import email_helper
+    from app.models import SystemSetting
+
+    class PlainSMTPPool(email_helper.SMTPPool):
+        def _connect(self, host, port, user, password):
+            server = email_helper.smtplib.SMTP(host, port, timeout=5)
+            server.login(user, password)
+            return server
+
+    stub = StubSMTPServer()
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    email_helper.smtp_pool = PlainSMTPPool()
+
+    app = create_app()
+    failures = 0
+
+    def check(name, ok, detail):
+        nonlocal failures
+        print(f"{'ok  ' if ok else 'FAIL'} {name}: {detail}")
+        failures += not ok
+
+    def batch(n, reject=()):
+        return [(f"{'reject' if i in reject else 'user'}{i}@example.com", 'Subject', f'Body {i}') for i in range(n)]
+
+    with app.app_context():
+        for key, value in (('EMAIL_PROVIDER', 'smtp'), ('EMAIL_HOST', '127.0.0.1'), ('EMAIL_PORT', str(stub.server_address[1])),
+                           ('EMAIL_USER', 'bench@example.com'), ('EMAIL_PASSWORD', 'secret'), ('EMAIL_FROM', 'bench@example.com')):
+            SystemSetting.set_value(key, value)
+
+        stub.reset()
+        first = email_helper.send_emails(batch(10))
+        second = email_helper.send_emails(batch(10))
+        check('connection reuse', all(first + second) and stub.delivered == 20 and stub.connections == 1,
+              f"{stub.delivered}/20 delivered over {stub.connections} connection(s)")
+
+        stub.reset(drop_after=3)
+        email_helper.smtp_pool = PlainSMTPPool()
+        results = email_helper.send_emails(batch(10))
+        check('reconnect after a dropped connection', all(results) and stub.delivered == 10 and stub.connections == 4,
+              f"{stub.delivered}/10 delivered over {stub.connections} connection(s)")
+
+        stub.reset()
+        email_helper.smtp_pool = PlainSMTPPool()
+        results = email_helper.send_emails(batch(10, reject={4}))
+        check('refused recipient', results == [i != 4 for i in range(10)] and stub.delivered == 9 and stub.connections == 1,
+              f"{stub.delivered}/9 delivered over {stub.connections} connection(s), results {results}")
+
+        SystemSetting.set_value('EMAIL_PORT', str(free_port()))
+        attempts = []
+        pool = PlainSMTPPool()
+        original_connect = pool._connect
+        pool._connect = lambda *args: attempts.append(args) or original_connect(*args)
+        email_helper.smtp_pool = pool
+        started = time.perf_counter()
+        results = email_helper.send_emails(batch(10))
+        elapsed = time.perf_counter() - started
+        check('unreachable host', results == [False] * 10 and len(attempts) == 1,
+              f"{results.count(False)}/10 failed after {len(attempts)} connect attempt(s) in {elapsed:.2f}s")
+
+    stub.shutdown()
+    if failures:
+        print(f"{failures} check(s) failed")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Concurrent reader/writer throughput on the shared SQLite database, before and after the
+connection tuning in create_app (WAL, synchronous=NORMAL, busy_timeout, mmap).
+
+Readers run dashboard-style queries (a user's alerts); the writer runs scan/dispatch-style
+transactions (update alerts' scan state, insert a notification, commit), each in its own process
+like the gunicorn workers and the scan worker. Reports operations per second, latency
+percentiles and "database is locked" errors for both configurations.
+
+    python benchmarks/sqlite_concurrency.py --readers 4 --seconds 10
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import multiprocessing
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=4, help='reader processes (gunicorn workers)')
+    parser.add_argument('--writers', type=int, default=1, help='writer processes (scan worker)')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--alerts', type=int, default=5000)
+    parser.add_argument('--rows-per-write', type=int, default=50, help='alerts updated per write transaction')
+    return parser.parse_args()
+
+def create_database(path, args):
+    # Real schema via the app, then plain sqlite3 for the data
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{path}"
+    os.environ['SKIP_DEFAULT_ADMIN'] = 'true'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    from app import create_app, db
+    app = create_app()
+    with app.app_context():
+        # Close the app's pooled connections so the journal mode can be switched below
+        db.engine.dispose()
+
+    rng = random.Random(1)
+    conn = sqlite3.connect(path)
+    conn.executemany('INSERT INTO user (id, username, password_hash, is_admin, notify_digest) VALUES (?, ?, ?, 0, 0)',
+                     [(i, f'user{i}', '') for i in range(1, args.users + 1)])
+    today = date.today()
+    conn.executemany(
+        'INSERT INTO alert (user_id, campground_id, sub_campground_id, start_date, end_date, min_nights, status, created_at) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+        [(rng.randint(1, args.users), 1, rng.randint(1, 200), str(today), str(today + timedelta(days=10)), 2, 'active', str(datetime.utcnow()))
+         for _ in range(args.alerts)]
+    )
+    conn.commit()
+    conn.close()
+
+def connect(path, tuned):
+    conn = sqlite3.connect(path, timeout=5)
+    if tuned:
+        from app import configure_sqlite_connection
+        configure_sqlite_connection(conn)
+    else:
+        # SQLite defaults: rollback journal, synchronous=FULL
+        conn.execute('PRAGMA journal_mode=DELETE')
+    return conn
+
+def reader(path, tuned, deadline, users, results):
+    conn = connect(path, tuned)
+    rng = random.Random(os.getpid())
+    latencies, errors = [], 0
+    while time.time() < deadline:
+        started = time.perf_counter()
+        try:
+            conn.execute('SELECT * FROM alert WHERE user_id = ? ORDER BY created_at DESC', (rng.randint(1, users),)).fetchall()
+            conn.execute('SELECT COUNT(*) FROM alert WHERE status = ?', ('active',)).fetchone()
+            latencies.append(time.perf_counter() - started)
+        except sqlite3.OperationalError:
+            errors += 1
+    conn.close()
+    results.put(('read', latencies, errors))
+
+def writer(path, tuned, deadline, alerts, rows_per_write, results):
+    conn = connect(path, tuned)
+    rng = random.Random(os.getpid())
+    latencies, errors = [], 0
+    while time.time() < deadline:
+        started = time.perf_counter()
+        try:
+            now = str(datetime.utcnow())
+            ids = [(now, rng.randint(1, alerts)) for _ in range(rows_per_write)]
+            conn.executemany('UPDATE alert SET last_scanned_at = ? WHERE id = ?', ids)
+            conn.execute(
+                "INSERT INTO notification (method_type, recipient, body, status, attempts, next_attempt_at, created_at) "
+                "VALUES ('email', 'bench@example.com', 'x', 'pending', 0, ?, ?)", (now, now))
+            conn.commit()
+            latencies.append(time.perf_counter() - started)
+        except sqlite3.OperationalError:
+            errors += 1
+            conn.rollback()
+    conn.close()
+    results.put(('write', latencies, errors))
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def run(path, tuned, args):
+    results = multiprocessing.Queue()
+    deadline = time.time() + args.seconds
+    procs = [multiprocessing.Process(target=reader, args=(path, tuned, deadline, args.users, results)) for _ in range(args.readers)]
+    procs += [multiprocessing.Process(target=writer, args=(path, tuned, deadline, args.alerts, args.rows_per_write, results)) for _ in range(args.writers)]
+    for proc in procs:
+        proc.start()
+    collected = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+
+    summary = {}
+    for kind in ('read', 'write'):
+        latencies = [lat for k, lats, _ in collected if k == kind for lat in lats]
+        errors = sum(err for k, _, err in collected if k == kind)
+        summary[kind] = {
+            'ops_per_sec': len(latencies) / args.seconds,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'locked_errors': errors,
+        }
+    return summary
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='bcparks-sqlite-bench-')
+    for label, tuned in (('default (rollback journal)', False), ('tuned (create_app pragmas)', True)):
+        path = os.path.join(workdir, f"{'tuned' if tuned else 'default'}.sqlite3")
+        create_database(path, args)
+        # Set the journal mode once up front (it is stored in the file)
+        connect(path, tuned).close()
+        summary = run(path, tuned, args)
+        print(f"{label}: {args.readers} reader(s), {args.writers} writer(s), {args.seconds:.0f}s")
+        for kind, stats in summary.items():
+            print(
+                f"  {kind:5}: {stats['ops_per_sec']:9.1f} ops/s  p50 {stats['p50_ms']:7.2f} ms  "
+                f"p99 {stats['p99_ms']:8.2f} ms  locked errors {stats['locked_errors']}"
+            )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""
+Local stand-in for camping.bcparks.ca, for benchmarks.
+
+Serves the endpoints the checker uses, shaped like the recorded responses in fixtures/:
+    /api/availability/map             synthetic daily availability per map (deterministic per seed)
+    /api/resourcelocation/<id>        campground details
+    /api/resourcelocation/resources   site names of a campground
+    /api/resourceLocation             campground list
+    /__bench/generation?value=N       switch the availability generation (simulates churn between ticks)
+
+Every map has --sites sites. A map's availability is a fixed base grid per day, with a --churn
+fraction of cells flipped differently in every generation, so consecutive ticks see changes.
+
+    python benchmarks/stub_server.py --port 8765
+"""
+import os
+import json
+import argparse
+import threading
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Day 0 of every map's availability grid; covers the scanner's 150 day limit with room to spare
+GRID_EPOCH = date.today() - timedelta(days=7)
+GRID_DAYS = 400
+
+def load_fixture(fixtures_dir, name):
+    with open(os.path.join(fixtures_dir, name), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+class StubData:
+    def __init__(self, fixtures_dir=FIXTURES_DIR, sites=40, available_ratio=0.4, churn=0.02, seed=1):
+        self.sites = sites
+        self.available_ratio = available_ratio
+        self.churn = churn
+        self.seed = seed
+        self.generation = 0
+        self._grids = {}
+        self._lock = threading.Lock()
+
+        # Take the per-day entry shape and the "not available" codes from the recorded response
+        recorded = load_fixture(fixtures_dir, 'availability_map.json')
+        days = [day for daily in recorded['resourceAvailabilities'].values() for day in daily]
+        self.day_extra = {k: v for k, v in days[0].items() if k != 'availability'}
+        self.closed_codes = sorted({day['availability'] for day in days if day['availability'] != 0}) or [1]
+        self.location = load_fixture(fixtures_dir, 'resourcelocation.json')
+        self.resource = next(iter(load_fixture(fixtures_dir, 'resources.json').values()))
+
+    def site_ids(self, map_id):
+        return [map_id * 1000 + i for i in range(self.sites)]
+
+    def _base_grid(self, map_id):
+        with self._lock:
+            grid = self._grids.get(map_id)
+            if grid is None:
+                rng = np.random.default_rng([self.seed, abs(map_id)])
+                grid = self._grids[map_id] = rng.random((self.sites, GRID_DAYS)) < self.available_ratio
+            return grid
+
+    def grid(self, map_id, generation):
+        base = self._base_grid(map_id)
+        if not self.churn:
+            return base
+        flips = np.random.default_rng([self.seed, abs(map_id), generation]).random(base.shape) < self.churn
+        return base ^ flips
+
+    def availability(self, map_id, start, end):
+        lo = max((start - GRID_EPOCH).days, 0)
+        hi = min((end - GRID_EPOCH).days + 1, GRID_DAYS)
+        grid = self.grid(map_id, self.generation)[:, lo:hi]
+        closed = self.closed_codes
+        res_avails = {}
+        for row, res_id in enumerate(self.site_ids(map_id)):
+            res_avails[str(res_id)] = [
+                dict(self.day_extra, availability=0 if is_open else closed[(row + col) % len(closed)])
+                for col, is_open in enumerate(grid[row].tolist())
+            ]
+        return {'mapId': map_id, 'resourceAvailabilities': res_avails, 'mapLinkAvailabilities': {}}
+
+    def location_details(self, location_id):
+        details = dict(self.location, resourceLocationId=location_id)
+        details['localizedValues'] = [dict(details['localizedValues'][0], fullName=f"Campground {location_id}", shortName=f"Camp {location_id}")]
+        return details
+
+    def resources(self, location_id):
+        # Campground ids equal map ids in the generated populations
+        resources = {}
+        for i, res_id in enumerate(self.site_ids(location_id)):
+            entry = dict(self.resource, resourceId=res_id)
+            entry['localizedValues'] = [dict(entry['localizedValues'][0], name=str(i + 1))]
+            resources[str(res_id)] = entry
+        return resources
+
+def make_handler(data):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            path = url.path.rstrip('/')
+            try:
+                if path == '/api/availability/map':
+                    start = datetime.strptime(params['startDate'], '%Y-%m-%d').date()
+                    end = datetime.strptime(params['endDate'], '%Y-%m-%d').date()
+                    body = data.availability(int(params['mapId']), start, end)
+                elif path == '/api/resourcelocation/resources':
+                    body = data.resources(int(params['resourceLocationId']))
+                elif path.startswith('/api/resourcelocation/'):
+                    body = data.location_details(int(path.rsplit('/', 1)[1]))
+                elif path == '/api/resourceLocation':
+                    body = [data.location_details(i) for i in range(1, 11)]
+                elif path == '/__bench/generation':
+                    data.generation = int(params['value'])
+                    body = {'generation': data.generation}
+                else:
+                    self.send_error(404)
+                    return
+            except (KeyError, ValueError) as e:
+                self.send_error(400, str(e))
+                return
+
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def serve(port, sites=40, available_ratio=0.4, churn=0.02, seed=1, fixtures_dir=FIXTURES_DIR, ready=None):
+    data = StubData(fixtures_dir, sites=sites, available_ratio=available_ratio, churn=churn, seed=seed)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(data))
+    if ready is not None:
+        ready.put(server.server_address[1])
+    server.serve_forever()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--sites', type=int, default=40, help='sites per map')
+    parser.add_argument('--available', type=float, default=0.4, help='fraction of available site-days')
+    parser.add_argument('--churn', type=float, default=0.02, help='fraction of site-days that differ per generation')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--fixtures', default=FIXTURES_DIR)
+    args = parser.parse_args()
+    print(f"Stub BC Parks API on http://127.0.0.1:{args.port}")
+    serve(args.port, args.sites, args.available, args.churn, args.seed, args.fixtures)
@@ -1,8 +1,13 @@
+import os
 import time
 import logging
 from app import create_app
 from flask_apscheduler import APScheduler
 from app.checker import check_alerts
+from app.scheduling import TICK_SECONDS
+from app.notifier import dispatch_notifications
+from app import sharding
+from app.metrics import start_metrics_server
 
 logger = logging.getLogger(__name__)
 
@@ -16,38 +21,25 @@ if __name__ == '__main__':
     scheduler.init_app(app)
     scheduler.start()
     
-    # Add Job
-    # Check every configured minutes (default 5)
-    # Initial Interval
-    with app.app_context():
-        from app.models import SystemSetting
-        current_interval = int(SystemSetting.get_value('SCAN_INTERVAL_MINUTES', '5'))
-        logger.info(f"Using scan interval: {current_interval} minute(s)")
+    # Scanner ticks every minute; each map is fetched only when it is due (see app/scheduling.py).
+    # SCAN_INTERVAL_MINUTES is read from the settings every tick as the base per-map interval,
+    # so admin changes apply without rescheduling.
+    scheduler.add_job(id='scanner_task', func=check_alerts, args=[app], trigger='interval', seconds=TICK_SECONDS)
 
-    scheduler.add_job(id='scanner_task', func=check_alerts, args=[app], trigger='interval', minutes=current_interval)
-    
-    # Config Watcher Job
-    def check_config_update(app_instance):
-        global current_interval
-        with app_instance.app_context():
-            try:
-                from app.models import SystemSetting
-                new_interval = int(SystemSetting.get_value('SCAN_INTERVAL_MINUTES', '5'))
-                if new_interval != current_interval:
-                    logger.info(f"Updating scan interval from {current_interval} to {new_interval} minutes")
-                    # Use standard 'remove_job' (native APScheduler name)
-                    try:
-                        scheduler.remove_job('scanner_task')
-                    except:
-                        pass # Job might not exist or verify failed
-                        
-                    scheduler.add_job(id='scanner_task', func=check_alerts, args=[app_instance], trigger='interval', minutes=new_interval)
-                    current_interval = new_interval
-            except Exception as e:
-                logger.error(f"Error checking config: {e}")
+    # Notification outbox dispatcher (delivery is decoupled from scanning)
+    dispatch_seconds = int(os.environ.get('NOTIFY_DISPATCH_SECONDS', '10'))
+    scheduler.add_job(id='notification_dispatcher', func=dispatch_notifications, args=[app], trigger='interval', seconds=dispatch_seconds)
+
+    # Sharded scanning: keep this worker's heartbeat and shard leases alive, also during long ticks
+    if sharding.sharding_enabled():
+        def renew_leases(app_instance):
+            with app_instance.app_context():
+                sharding.renew_leases()
+        logger.info(f"Sharded scanning enabled: worker {sharding.WORKER_ID}, {sharding.WORKER_SHARDS} shards")
+        scheduler.add_job(id='lease_heartbeat', func=renew_leases, args=[app], trigger='interval', seconds=max(1, sharding.WORKER_LEASE_SECONDS // 3))
 
-    # Run watcher every 1 minute
-    scheduler.add_job(id='config_watcher', func=check_config_update, args=[app], trigger='interval', minutes=1)
+    # Scan/notification metrics for Prometheus (METRICS_PORT, 0 disables)
+    start_metrics_server()
 
     logger.info("Worker started. Running scheduler...")
     
@@ -56,3 +48,5 @@ if __name__ == '__main__':
             time.sleep(1)
     except KeyboardInterrupt:
         logger.info("Worker stopping...")
+        with app.app_context():
+            sharding.release_shards()